@@ -6,10 +6,13 @@ SetOps - 本地千万级数据交并差运算工具
 使用PySide6 (Qt for Python) 实现的前端界面
 """
 
+import time
+STARTUP_BEGIN = time.perf_counter()  # 启动计时起点，尽量靠前
+
 import sys
 import os
 import threading
-import time
+import multiprocessing
 import tempfile
 from datetime import datetime
 import logging
@@ -34,7 +37,7 @@ from PySide6.QtWidgets import (
     QGridLayout, QLabel, QPushButton, QFileDialog, QListWidget, 
     QRadioButton, QGroupBox, QProgressBar, QComboBox, QLineEdit,
     QMessageBox, QSplitter, QFrame, QSizePolicy, QTableWidget, QTableWidgetItem,
-    QHeaderView
+    QHeaderView, QCheckBox, QDialog
 )
 from PySide6.QtCore import (
     Qt, QTimer, Signal, QObject, QThread
@@ -43,9 +46,14 @@ from PySide6.QtGui import (
     QDragEnterEvent, QDropEvent, QIcon, QFont
 )
 
-# 导入后端模块
+# 导入后端模块（pandas等重量级依赖在第一次处理数据时才加载）
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
-from data_processor import DataProcessor
+from data_processor import (
+    DataProcessor, SPLIT_REGIONS, TEXT_COMPRESSIONS, NORMALIZATION_RULES, is_supported_input, remove_stale_jobs
+)
+
+# 启动时间预算：从进程开始导入到主窗口显示
+STARTUP_BUDGET = 1.0  # 秒
 
 class FileSelectorWidget(QWidget):
     """文件选择部件"""
@@ -131,10 +139,12 @@ class WorkerSignals(QObject):
     progress = Signal(int, int, int, str, str)  # 当前进度, 总进度, 速度, 用时, 状态
     finished = Signal(int, str, str)  # 总用时, 记录数, 输出文件
     error = Signal(str)  # 错误信息
+    preview = Signal(object)  # 结果预览，区域名 -> DataProcessor.preview_result 的返回值
 
 class DataProcessingWorker(QThread):
     """数据处理工作线程"""
-    def __init__(self, files_a, files_b, operation, output_path, export_format):
+    def __init__(self, files_a, files_b, operation, output_path, export_format, compression=None, normalization=None,
+                 incremental=False, resumable=False):
         super().__init__()
         self.signals = WorkerSignals()
         self.files_a = files_a
@@ -142,6 +152,16 @@ class DataProcessingWorker(QThread):
         self.operation = operation
         self.output_path = output_path
         self.export_format = export_format
+        self.compression = compression
+        self.normalization = list(normalization or [])
+        # 增量模式：保留上次运行的增量库，只读取新增和变化的分片
+        self.incremental = incremental
+        # 可恢复模式：工作库落盘并记录检查点，中断或出错后再次运行时从检查点继续
+        self.resumable = resumable
+        # 输出文件扩展名，压缩导出时追加 .gz / .zst
+        self.extension = export_format + TEXT_COMPRESSIONS.get(compression, '')
+        # CSV/TXT 结果按 rowid 区间多进程并行导出（单CPU或结果较小时自动退回顺序导出）
+        self.parallel = export_format in ['csv', 'txt']
         self.is_running = True
         self.processor = None
     
@@ -149,7 +169,7 @@ class DataProcessingWorker(QThread):
         """运行数据处理"""
         try:
             # 创建数据处理器
-            self.processor = DataProcessor()
+            self.processor = DataProcessor(normalization=self.normalization)
             self.processor.is_processing = True
             
             # 开始处理
@@ -160,76 +180,154 @@ class DataProcessingWorker(QThread):
             
             # 初始化数据库
             self.signals.progress.emit(0, 100, 0, "00:00:00", "初始化数据库")
-            self.processor.init_db()
+            if self.incremental:
+                # 同一目录下的数据集共用一个增量库，分片增删改后再次运行时只处理变化
+                delta_id = self.processor.make_delta_id(self.files_a, self.files_b)
+                self.processor.init_db(self.files_a + self.files_b, delta_id=delta_id)
+            elif self.resumable:
+                # 相同输入和参数的任务共用一个任务ID，中断后再次运行时从检查点恢复
+                job_id = self.processor.make_job_id(self.files_a, self.files_b, self.operation, self.export_format,
+                                                    self.compression, self.output_path)
+                self.processor.init_db(self.files_a + self.files_b, job_id=job_id)
+            else:
+                # 一次性任务：工作库可放在内存中，用完即删
+                self.processor.init_db(self.files_a + self.files_b)
+            
+            # 推断列类型，两个数据集使用同一套类型
+            self.signals.progress.emit(5, 100, 0, "00:00:00", "推断列类型")
+            column_types = self.processor.resolve_column_types(self.files_a, self.files_b)
+            
+            if self.incremental:
+                # 增量模式：应用两个数据集的分片变化并更新结果表
+                self.signals.progress.emit(10, 100, 0, "00:00:00", "增量更新")
+                result_count = self.processor.delta_refresh(
+                    self.files_a, self.files_b, self.operation, column_types, self.progress_callback(10, 90)
+                )
+            else:
+                result_count = self.compute_result(column_types)
+            
+            if not self.is_running:
+                return
             
+            # 导出结果
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            self.signals.progress.emit(90, 100, 0, "00:00:00", "导出结果")
+            if self.operation == 'split':
+                # 拆分运算：每个区域单独导出一个文件
+                output_files = []
+                for region, table in SPLIT_REGIONS.items():
+                    region_file = (self.processor.resumed_export_path(table)
+                                   or os.path.join(self.output_path, f"{timestamp}_result_{region}.{self.extension}"))
+                    self.processor.export_result(
+                        region_file,
+                        self.export_format,
+                        self.progress_callback(90, 100),
+                        table_name=table,
+                        compression=self.compression,
+                        parallel=self.parallel
+                    )
+                    output_files.append(region_file)
+                output_file = '\n'.join(output_files)
+            else:
+                output_file = (self.processor.resumed_export_path()
+                               or os.path.join(self.output_path, f"{timestamp}_result.{self.extension}"))
+                exported = self.processor.export_result(
+                    output_file, 
+                    self.export_format,
+                    self.progress_callback(90, 100),
+                    compression=self.compression,
+                    parallel=self.parallel
+                )
+            
+            if self.is_running:
+                # 处理完成
+                self.processor.finish_job()
+                elapsed_time = time.time() - self.start_time
+                elapsed_str = self.format_time(int(elapsed_time))
+                logger.info(f"运行报告: {self.processor.run_report}")
+                
+                # 清理工作库前生成结果预览，预览失败不影响处理结果
+                tables = SPLIT_REGIONS if self.operation == 'split' else {'result': 'result'}
+                try:
+                    self.signals.preview.emit(
+                        {region: self.processor.preview_result(table) for region, table in tables.items()}
+                    )
+                except Exception as e:
+                    logger.warning(f"生成结果预览失败: {e}")
+                
+                # 发送完成信号
+                self.signals.finished.emit(int(elapsed_time), str(result_count), output_file)
+        except Exception as e:
+            if not self.is_running:
+                # 用户停止时SQL被中断，属于正常结束
+                logger.info(f"处理已停止: {e}")
+                return
+            # 发送错误信号
+            self.signals.error.emit(str(e))
+        finally:
+            # 清理资源
+            if self.processor:
+                self.processor.is_processing = False
+                self.processor.close_db()
+    
+    def compute_result(self, column_types):
+        """导入、去重两个数据集并执行运算，返回结果行数，用户停止时返回None"""
+        # 小数据集对大数据集的交集/差集使用探测模式：只导入小数据集，大数据集流式读取
+        probe_side = self.processor.probe_plan(self.files_a, self.files_b, self.operation)
+        
+        if probe_side != 'table_b':
             # 导入数据集A
             self.signals.progress.emit(10, 100, 0, "00:00:00", "导入数据集A")
             total_a, file_info_a = self.processor.import_files(
                 self.files_a, 
                 'table_a',
-                self.progress_callback(10, 40)
+                self.progress_callback(10, 40),
+                column_types=column_types
             )
             
             if not self.is_running:
-                return
+                return None
             
             # 去重数据集A
             self.signals.progress.emit(40, 100, 0, "00:00:00", "去重数据集A")
             deduped_a = self.processor.deduplicate('table_a')
             
             if not self.is_running:
-                return
-            
+                return None
+        
+        if probe_side != 'table_a':
             # 导入数据集B
             self.signals.progress.emit(50, 100, 0, "00:00:00", "导入数据集B")
             total_b, file_info_b = self.processor.import_files(
                 self.files_b, 
                 'table_b',
-                self.progress_callback(50, 80)
+                self.progress_callback(50, 80),
+                column_types=column_types
             )
             
             if not self.is_running:
-                return
+                return None
             
             # 去重数据集B
             self.signals.progress.emit(80, 100, 0, "00:00:00", "去重数据集B")
             deduped_b = self.processor.deduplicate('table_b')
             
             if not self.is_running:
-                return
-            
+                return None
+        
+        if probe_side:
+            # 探测模式：逐块读取大数据集并在小数据集的哈希集合中查找
+            big_files = self.files_b if probe_side == 'table_a' else self.files_a
+            self.signals.progress.emit(50, 100, 0, "00:00:00", "探测大数据集")
+            result_count = self.processor.probe_operation(
+                probe_side, big_files, self.operation, self.progress_callback(50, 90)
+            )
+        else:
             # 执行交并差运算
             self.signals.progress.emit(85, 100, 0, "00:00:00", "执行交并差运算")
             result_count = self.processor.process_operation('table_a', 'table_b', self.operation)
-            
-            if not self.is_running:
-                return
-            
-            # 导出结果
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            output_file = os.path.join(self.output_path, f"{timestamp}_result.{self.export_format}")
-            self.signals.progress.emit(90, 100, 0, "00:00:00", "导出结果")
-            exported = self.processor.export_result(
-                output_file, 
-                self.export_format,
-                self.progress_callback(90, 100)
-            )
-            
-            if self.is_running:
-                # 处理完成
-                elapsed_time = time.time() - self.start_time
-                elapsed_str = self.format_time(int(elapsed_time))
-                
-                # 发送完成信号
-                self.signals.finished.emit(int(elapsed_time), str(result_count), output_file)
-        except Exception as e:
-            # 发送错误信号
-            self.signals.error.emit(str(e))
-        finally:
-            # 清理资源
-            if self.processor:
-                self.processor.is_processing = False
-                self.processor.close_db()
+        
+        return result_count
     
     def progress_callback(self, start_percent, end_percent):
         """进度回调函数"""
@@ -266,9 +364,10 @@ class DataProcessingWorker(QThread):
         return callback
     
     def stop(self):
-        """停止处理"""
+        """停止处理：用户主动停止的任务不再恢复，删除其工作库"""
         self.is_running = False
         if self.processor:
+            self.processor.discard_job()
             self.processor.stop_processing()
     
     def format_time(self, seconds):
@@ -278,6 +377,69 @@ class DataProcessingWorker(QThread):
         s = seconds % 60
         return f"{h:02d}:{m:02d}:{s:02d}"
 
+class ResultPreviewDialog(QDialog):
+    """结果预览窗口：首尾行、随机抽样和列统计，不需要打开输出文件"""
+    VIEWS = {'head': '前N行', 'tail': '后N行', 'sample': '随机抽样', 'stats': '列统计'}
+    
+    def __init__(self, previews, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("结果预览")
+        self.resize(900, 560)
+        self.previews = previews
+        
+        layout = QVBoxLayout(self)
+        selector_layout = QHBoxLayout()
+        
+        # 拆分运算有多个结果区域
+        self.table_combo = QComboBox()
+        self.table_combo.addItems(list(previews))
+        self.table_combo.setVisible(len(previews) > 1)
+        self.table_combo.currentIndexChanged.connect(self.refresh)
+        selector_layout.addWidget(self.table_combo)
+        
+        self.view_combo = QComboBox()
+        for view, label in self.VIEWS.items():
+            self.view_combo.addItem(label, view)
+        self.view_combo.currentIndexChanged.connect(self.refresh)
+        selector_layout.addWidget(self.view_combo)
+        selector_layout.addStretch()
+        layout.addLayout(selector_layout)
+        
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("font-size: 13px; color: #666;")
+        layout.addWidget(self.summary_label)
+        
+        self.table = QTableWidget()
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        layout.addWidget(self.table)
+        
+        self.refresh()
+    
+    def refresh(self):
+        """按所选区域和视图刷新表格"""
+        preview = self.previews[self.table_combo.currentText()]
+        view = self.view_combo.currentData()
+        stats = preview['stats']
+        
+        summary = f"总行数：{preview['total']:,}"
+        if view == 'stats':
+            summary += f"    统计行数：{stats['rows']:,}{'' if stats['exact'] else '（抽样统计）'}"
+            headers = ['列', '不同值数', '空值数']
+            rows = [[col, values['distinct'], values['nulls']] for col, values in stats['columns'].items()]
+        else:
+            headers = preview['columns']
+            rows = preview[view]
+        self.summary_label.setText(summary)
+        
+        self.table.clear()
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                self.table.setItem(i, j, QTableWidgetItem('' if value is None else str(value)))
+
 class SetOpsUI(QMainWindow):
     """SetOps 主界面"""
     def __init__(self):
@@ -302,6 +464,11 @@ class SetOpsUI(QMainWindow):
         self.operation = "intersection"
         self.output_path = ""
         self.export_format = "csv"
+        self.compression = None
+        self.normalization = []  # 比较规则
+        self.incremental = False  # 增量模式
+        self.resumable = False  # 可恢复模式
+        self.previews = {}  # 最近一次运行的结果预览
         
         # 工作线程
         self.worker = None
@@ -521,6 +688,11 @@ class SetOpsUI(QMainWindow):
             QRadioButton::indicator:checked {
                 background-color: #0078d4;
             }
+            QCheckBox {
+                color: #333333;
+                font-size: 11px;
+                padding: 2px 0;
+            }
         """)
         group_box.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         
@@ -549,6 +721,35 @@ class SetOpsUI(QMainWindow):
         difference_ba_radio.toggled.connect(lambda checked: self.on_operation_changed("differenceBA", checked))
         layout.addWidget(difference_ba_radio)
         
+        # 对称差
+        symmetric_difference_radio = QRadioButton("对称差 (△)")
+        symmetric_difference_radio.toggled.connect(lambda checked: self.on_operation_changed("symmetricDifference", checked))
+        layout.addWidget(symmetric_difference_radio)
+        
+        # 拆分为三个区域
+        split_radio = QRadioButton("拆分 (1-2/∩/2-1)")
+        split_radio.toggled.connect(lambda checked: self.on_operation_changed("split", checked))
+        layout.addWidget(split_radio)
+        
+        # 比较规则：勾选后按规范化的值比较，输出原始行
+        rules_label = QLabel("比较规则：")
+        rules_label.setStyleSheet("font-size: 10px; color: #666; font-weight: 500; padding-top: 6px;")
+        layout.addWidget(rules_label)
+        for rule, label in NORMALIZATION_RULES.items():
+            rule_checkbox = QCheckBox(label)
+            rule_checkbox.toggled.connect(lambda checked, rule=rule: self.on_normalization_changed(rule, checked))
+            layout.addWidget(rule_checkbox)
+        
+        # 增量模式：再次运行时只处理新增和变化的分片
+        incremental_checkbox = QCheckBox("增量模式（只处理变化的分片）")
+        incremental_checkbox.toggled.connect(self.on_incremental_changed)
+        layout.addWidget(incremental_checkbox)
+        
+        # 可恢复模式：意外中断后再次运行时从检查点继续（工作库落盘，速度略慢）
+        resumable_checkbox = QCheckBox("可恢复（中断后从检查点继续）")
+        resumable_checkbox.toggled.connect(self.on_resumable_changed)
+        layout.addWidget(resumable_checkbox)
+        
         # 添加弹性空间
         layout.addStretch(1)
         
@@ -628,7 +829,7 @@ class SetOpsUI(QMainWindow):
         format_layout.addWidget(format_label)
         
         self.export_format_combo = QComboBox()
-        self.export_format_combo.addItems(["CSV", "Excel", "TXT"])
+        self.export_format_combo.addItems(["CSV", "Excel", "TXT", "Parquet", "Arrow"])
         self.export_format_combo.setStyleSheet("""
             QComboBox {
                 padding: 3px;
@@ -653,6 +854,21 @@ class SetOpsUI(QMainWindow):
         
         layout.addLayout(format_layout)
         
+        # 压缩方式（仅 CSV/TXT）
+        compression_layout = QVBoxLayout()
+        compression_layout.setSpacing(2)
+        compression_label = QLabel("压缩：")
+        compression_label.setStyleSheet("font-size: 10px; color: #666; font-weight: 500;")
+        compression_layout.addWidget(compression_label)
+        
+        self.compression_combo = QComboBox()
+        self.compression_combo.addItems(["无", "gzip", "zstd"])
+        self.compression_combo.setStyleSheet(self.export_format_combo.styleSheet())
+        self.compression_combo.currentIndexChanged.connect(self.on_compression_changed)
+        compression_layout.addWidget(self.compression_combo)
+        
+        layout.addLayout(compression_layout)
+        
         group_box.setLayout(layout)
         
         return group_box
@@ -940,6 +1156,8 @@ class SetOpsUI(QMainWindow):
                     "CSV Files (*.csv)",
                     "Excel Files (*.xlsx *.xls)",
                     "Text Files (*.txt)",
+                    "Parquet/Arrow Files (*.parquet *.arrow *.feather)",
+                    "Compressed Files (*.gz *.zst *.bz2 *.xz *.zip)",
                     "All Files (*.*)"
                 ])
                 
@@ -1034,8 +1252,7 @@ class SetOpsUI(QMainWindow):
                         continue
                     
                     # 验证文件格式
-                    file_ext = os.path.splitext(file)[1].lower()
-                    if file_ext not in ['.csv', '.xlsx', '.xls', '.txt']:
+                    if not is_supported_input(file):
                         invalid_files.append(f"{os.path.basename(file)} (不支持的文件格式)")
                         continue
                     
@@ -1180,7 +1397,8 @@ class SetOpsUI(QMainWindow):
                     self.output_path = self.output_path.replace('/', '\\')
                     # 显示完整的输出文件名
                     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                    output_file = os.path.join(self.output_path, f"{timestamp}_result.{self.export_format}")
+                    extension = self.export_format + TEXT_COMPRESSIONS.get(self.compression, '')
+                    output_file = os.path.join(self.output_path, f"{timestamp}_result.{extension}")
                     output_file = output_file.replace('/', '\\')
                     self.output_path_edit.setText(output_file)
                     QMessageBox.information(self, "成功", "已选择输出路径")
@@ -1236,7 +1454,7 @@ class SetOpsUI(QMainWindow):
                 return
             
             # 验证操作类型
-            valid_operations = ["intersection", "union", "differenceAB", "differenceBA"]
+            valid_operations = ["intersection", "union", "differenceAB", "differenceBA", "symmetricDifference", "split"]
             if self.operation not in valid_operations:
                 error_msg = f"无效的操作类型: {self.operation}"
                 logger.error(error_msg)
@@ -1244,7 +1462,7 @@ class SetOpsUI(QMainWindow):
                 return
             
             # 验证导出格式
-            valid_formats = ["csv", "xlsx", "txt"]
+            valid_formats = ["csv", "xlsx", "txt", "parquet", "arrow"]
             if self.export_format not in valid_formats:
                 error_msg = f"无效的导出格式: {self.export_format}"
                 logger.error(error_msg)
@@ -1289,12 +1507,16 @@ class SetOpsUI(QMainWindow):
             logger.info(f"执行操作：{self.operation}")
             logger.info(f"输出路径：{self.output_path}")
             logger.info(f"导出格式：{self.export_format}")
+            logger.info(f"比较规则：{self.normalization or '无'}")
+            logger.info(f"增量模式：{'是' if self.incremental else '否'}")
+            logger.info(f"可恢复模式：{'是' if self.resumable else '否'}")
             
             # 开始处理
             self.start_button.setEnabled(False)
             self.stop_button.setEnabled(True)
             self.progress_frame.setVisible(True)
             self.result_frame.setVisible(False)
+            self.previews = {}
             
             # 初始化进度
             self.progress_bar.setValue(0)
@@ -1313,13 +1535,18 @@ class SetOpsUI(QMainWindow):
                     self.files_b,
                     self.operation,
                     self.output_path,
-                    self.export_format
+                    self.export_format,
+                    self.compression,
+                    self.normalization,
+                    self.incremental,
+                    self.resumable
                 )
                 
                 # 连接信号
                 self.worker.signals.progress.connect(self.update_progress)
                 self.worker.signals.finished.connect(self.process_finished)
                 self.worker.signals.error.connect(self.process_error)
+                self.worker.signals.preview.connect(self.set_previews)
                 
                 # 启动线程
                 logger.info("启动数据处理工作线程")
@@ -1422,11 +1649,22 @@ class SetOpsUI(QMainWindow):
                         f"总处理时间：{elapsed_str}\n" \
                         f"处理记录数：{record_count:,}\n" \
                         f"输出文件：{output_file}\n"
-        QMessageBox.information(self, "处理结果", result_message)
+        if self.previews:
+            box = QMessageBox(QMessageBox.Information, "处理结果", result_message, QMessageBox.Ok, self)
+            preview_button = box.addButton("预览结果", QMessageBox.ActionRole)
+            box.exec()
+            if box.clickedButton() == preview_button:
+                ResultPreviewDialog(self.previews, self).exec()
+        else:
+            QMessageBox.information(self, "处理结果", result_message)
         
         # 不显示结果区域，避免窗口布局变化
         # self.result_frame.setVisible(True)
     
+    def set_previews(self, previews):
+        """保存工作线程生成的结果预览"""
+        self.previews = previews
+    
     def process_error(self, error_message):
         """处理错误"""
         self.start_button.setEnabled(True)
@@ -1541,12 +1779,10 @@ class SetOpsUI(QMainWindow):
     
     def scan_folder_for_files(self, folder_path):
         """扫描文件夹中的支持文件"""
-        supported_extensions = ['.csv', '.xlsx', '.xls', '.txt']
         files = []
         
         try:
             logger.info(f"Scanning folder: {folder_path}")
-            logger.info(f"Supported extensions: {supported_extensions}")
             
             if not os.path.exists(folder_path):
                 logger.error(f"Folder does not exist: {folder_path}")
@@ -1563,8 +1799,8 @@ class SetOpsUI(QMainWindow):
             for root, _, filenames in os.walk(folder_path):
                 logger.info(f"Processing directory: {root}, found {len(filenames)} files")
                 for filename in filenames:
-                    file_ext = os.path.splitext(filename)[1].lower()
-                    if file_ext in supported_extensions:
+                    # 支持 CSV/Excel/TXT/Parquet/Arrow 及压缩文件（.csv.gz 等）和 zip 分片归档
+                    if is_supported_input(filename):
                         full_path = os.path.join(root, filename)
                         files.append(full_path)
                         logger.info(f"Added file: {full_path}")
@@ -1582,14 +1818,43 @@ class SetOpsUI(QMainWindow):
         if checked:
             self.operation = operation
     
+    def on_normalization_changed(self, rule, checked):
+        """比较规则改变"""
+        if checked and rule not in self.normalization:
+            self.normalization.append(rule)
+        elif not checked and rule in self.normalization:
+            self.normalization.remove(rule)
+    
+    def on_incremental_changed(self, checked):
+        """增量模式改变"""
+        self.incremental = checked
+    
+    def on_resumable_changed(self, checked):
+        """可恢复模式改变"""
+        self.resumable = checked
+    
     def on_export_format_changed(self, index):
         """导出格式改变"""
-        formats = ["csv", "xlsx", "txt"]
+        formats = ["csv", "xlsx", "txt", "parquet", "arrow"]
         self.export_format = formats[index]
-        # 更新输出路径显示
+        # 只有 CSV/TXT 支持压缩
+        text_format = self.export_format in ['csv', 'txt']
+        self.compression_combo.setEnabled(text_format)
+        if not text_format:
+            self.compression_combo.setCurrentIndex(0)
+        self.update_output_file_display()
+    
+    def on_compression_changed(self, index):
+        """压缩方式改变"""
+        self.compression = [None, 'gzip', 'zstd'][index]
+        self.update_output_file_display()
+    
+    def update_output_file_display(self):
+        """更新输出路径显示"""
         if self.output_path:
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            output_file = os.path.join(self.output_path, f"{timestamp}_result.{self.export_format}")
+            extension = self.export_format + TEXT_COMPRESSIONS.get(self.compression, '')
+            output_file = os.path.join(self.output_path, f"{timestamp}_result.{extension}")
             self.output_path_edit.setText(output_file)
     
     def update_dataset_display_state(self):
@@ -1638,8 +1903,29 @@ class SetOpsUI(QMainWindow):
         s = seconds % 60
         return f"{h:02d}:{m:02d}:{s:02d}"
 
+def report_startup_time():
+    """记录启动耗时，超出预算时给出警告"""
+    startup_time = time.perf_counter() - STARTUP_BEGIN
+    if startup_time > STARTUP_BUDGET:
+        logger.warning(f"启动耗时 {startup_time:.2f} 秒，超出预算 {STARTUP_BUDGET:.2f} 秒")
+    else:
+        logger.info(f"启动耗时 {startup_time:.2f} 秒")
+    return startup_time
+
 if __name__ == "__main__":
+    # 打包后的程序并行导出时会以子进程方式重新启动自身
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = SetOpsUI()
     window.show()
+    app.processEvents()
+    startup_time = report_startup_time()
+    
+    # 清理长期未恢复的任务工作库（窗口显示后执行，不计入启动耗时）
+    remove_stale_jobs()
+    
+    # 启动基准：python SetOpsUI.py --benchmark-startup，窗口显示后立即退出，超出预算时返回1（耗时见日志）
+    if '--benchmark-startup' in sys.argv:
+        sys.exit(0 if startup_time <= STARTUP_BUDGET else 1)
+    
     sys.exit(app.exec())
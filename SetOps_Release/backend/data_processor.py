@@ -10,6 +10,20 @@ import websockets
 import json
 from concurrent.futures import ThreadPoolExecutor
 
+# 拆分运算（split）的维恩区域及其结果表
+SPLIT_REGIONS = {
+    'differenceAB': 'result_a_only',
+    'intersection': 'result_both',
+    'differenceBA': 'result_b_only'
+}
+
+
+def split_output_path(output_path, region):
+    """拆分运算中各区域的输出路径：在扩展名前加上区域名"""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_{region}{ext}"
+
+
 class DataProcessor:
     def __init__(self):
         self.temp_db = None
@@ -163,16 +177,43 @@ class DataProcessor:
         elif operation == 'differenceBA':
             # 差集 B-A
             sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_b} EXCEPT SELECT {columns_str} FROM {table_a}"
+        elif operation == 'symmetricDifference':
+            # 对称差 A△B：两个差集互不相交，直接拼接
+            sql = (f"CREATE TABLE {result_table} AS "
+                   f"SELECT * FROM (SELECT {columns_str} FROM {table_a} EXCEPT SELECT {columns_str} FROM {table_b}) "
+                   f"UNION ALL "
+                   f"SELECT * FROM (SELECT {columns_str} FROM {table_b} EXCEPT SELECT {columns_str} FROM {table_a})")
+        elif operation == 'split':
+            # 拆分：单次分类扫描，两个表均已去重，同一行在A中记1、在B中记2，求和后
+            # 1 = 仅A，2 = 仅B，3 = 两者都有
+            sql = (f"CREATE TABLE result_regions AS "
+                   f"SELECT {columns_str}, SUM(_src) AS _region FROM ("
+                   f"SELECT {columns_str}, 1 AS _src FROM {table_a} "
+                   f"UNION ALL "
+                   f"SELECT {columns_str}, 2 AS _src FROM {table_b}"
+                   f") GROUP BY {columns_str}")
         else:
             raise ValueError(f"不支持的操作: {operation}")
         
         # 执行操作
         self.cursor.execute(sql)
-        self.conn.commit()
         
-        # 获取结果行数
-        self.cursor.execute(f"SELECT COUNT(*) FROM {result_table}")
-        result_count = self.cursor.fetchone()[0]
+        if operation == 'split':
+            # 各区域写入 SPLIT_REGIONS 中的结果表，结果行数为三个区域之和
+            region_codes = {'differenceAB': 1, 'differenceBA': 2, 'intersection': 3}
+            result_count = 0
+            for region, table in SPLIT_REGIONS.items():
+                self.cursor.execute(f"CREATE TABLE {table} AS SELECT {columns_str} FROM result_regions WHERE _region = {region_codes[region]}")
+                self.cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                result_count += self.cursor.fetchone()[0]
+            self.cursor.execute("DROP TABLE result_regions")
+            self.conn.commit()
+        else:
+            self.conn.commit()
+            
+            # 获取结果行数
+            self.cursor.execute(f"SELECT COUNT(*) FROM {result_table}")
+            result_count = self.cursor.fetchone()[0]
         
         if progress_callback:
             progress_callback({
@@ -184,16 +225,19 @@ class DataProcessor:
         
         return result_count
     
-    def export_result(self, output_path, export_format, progress_callback=None):
-        """导出结果"""
+    def export_result(self, output_path, export_format, progress_callback=None, table_name='result', compression='zstd'):
+        """导出结果表 table_name（拆分运算时为 SPLIT_REGIONS 中的区域表）
+        
+        compression 只用于 parquet/arrow：parquet 支持 zstd/snappy/gzip/brotli/lz4/none，arrow 支持 zstd/lz4/none。
+        """
         batch_size = 100000
         
         # 获取表结构
-        self.cursor.execute("PRAGMA table_info(result)")
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
         columns = [col[1] for col in self.cursor.fetchall()]
         
         # 获取总行数
-        self.cursor.execute("SELECT COUNT(*) FROM result")
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
         total_rows = self.cursor.fetchone()[0]
         
         # 分批导出
@@ -207,7 +251,7 @@ class DataProcessor:
                 
                 # 分批读取并写入
                 while processed < total_rows:
-                    self.cursor.execute(f"SELECT * FROM result LIMIT {batch_size} OFFSET {processed}")
+                    self.cursor.execute(f"SELECT * FROM {table_name} LIMIT {batch_size} OFFSET {processed}")
                     rows = self.cursor.fetchall()
                     
                     for row in rows:
@@ -230,7 +274,7 @@ class DataProcessor:
             with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
                 # 分批读取并写入
                 while processed < total_rows:
-                    self.cursor.execute(f"SELECT * FROM result LIMIT {batch_size} OFFSET {processed}")
+                    self.cursor.execute(f"SELECT * FROM {table_name} LIMIT {batch_size} OFFSET {processed}")
                     rows = self.cursor.fetchall()
                     
                     df = pd.DataFrame(rows, columns=columns)
@@ -261,7 +305,7 @@ class DataProcessor:
                 
                 # 分批读取并写入
                 while processed < total_rows:
-                    self.cursor.execute(f"SELECT * FROM result LIMIT {batch_size} OFFSET {processed}")
+                    self.cursor.execute(f"SELECT * FROM {table_name} LIMIT {batch_size} OFFSET {processed}")
                     rows = self.cursor.fetchall()
                     
                     for row in rows:
@@ -279,151 +323,147 @@ class DataProcessor:
                             'status': '导出中...'
                         })
         
+        elif export_format in ['parquet', 'arrow']:
+            # 列式导出：每批写为一个 Parquet 行组 / Arrow 记录批，Parquet 对字符串列使用字典编码
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            
+            # 导入时所有列都按 TEXT 存储
+            schema = pa.schema([(col, pa.string()) for col in columns])
+            codec = None if compression == 'none' else compression
+            if export_format == 'parquet':
+                writer = pq.ParquetWriter(output_path, schema, compression=codec or 'none', use_dictionary=True)
+                sink = None
+            else:
+                sink = pa.OSFile(output_path, 'wb')
+                writer = pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+            
+            try:
+                # 分批读取并写入
+                while processed < total_rows:
+                    self.cursor.execute(f"SELECT * FROM {table_name} LIMIT {batch_size} OFFSET {processed}")
+                    rows = self.cursor.fetchall()
+                    
+                    arrays = [pa.array(values, type=pa.string()) for values in zip(*rows)]
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                    
+                    processed += len(rows)
+                    
+                    if progress_callback:
+                        progress_callback({
+                            'type': 'export',
+                            'processed': processed,
+                            'total': total_rows,
+                            'status': '导出中...'
+                        })
+
+            finally:
+                writer.close()
+                if sink:
+                    sink.close()
+        
+        else:
+            raise ValueError(f"不支持的导出格式: {export_format}")
+        
         return processed
     
-    async def start_websocket_server(self, port=8765):
-        """启动WebSocket服务器"""
-        async def handler(websocket, path):
+    def preview_result(self, rows=100, stats_rows=200000, table_name='result'):
+        """结果预览：总行数、首尾各 rows 行和各列统计，须在 close_db 之前调用
+        
+        列统计最多扫描前 stats_rows 行，超出时 exact 为 False。
+        """
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        columns = [col[1] for col in self.cursor.fetchall()]
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        total_rows = self.cursor.fetchone()[0]
+        
+        self.cursor.execute(f"SELECT * FROM {table_name} ORDER BY rowid LIMIT ?", (rows,))
+        head = [list(row) for row in self.cursor.fetchall()]
+        self.cursor.execute(f"SELECT * FROM {table_name} ORDER BY rowid DESC LIMIT ?", (rows,))
+        tail = [list(row) for row in reversed(self.cursor.fetchall())]
+        
+        aggregates = ', '.join(f'COUNT(DISTINCT "{col}"), SUM("{col}" IS NULL)' for col in columns)
+        self.cursor.execute(f"SELECT {aggregates} FROM (SELECT * FROM {table_name} ORDER BY rowid LIMIT ?)", (stats_rows,))
+        row = self.cursor.fetchone()
+        
+        return {
+            'columns': columns,
+            'total': total_rows,
+            'head': head,
+            'tail': tail,
+            'stats': {
+                'rows': min(total_rows, stats_rows),
+                'exact': total_rows <= stats_rows,
+                'columns': {
+                    col: {'distinct': row[2 * i], 'nulls': row[2 * i + 1] or 0}
+                    for i, col in enumerate(columns)
+                }
+            }
+        }
+    
+    async def start_websocket_server(self, port=8765, max_workers=None):
+        """启动WebSocket服务器
+        
+        任务交给 JobScheduler 在进程池中执行，每个任务有独立的任务ID和临时数据库，
+        多个客户端可以同时提交任务并订阅各自的进度。
+        """
+        from job_scheduler import JobScheduler
+        
+        scheduler = JobScheduler(max_workers)
+        await scheduler.start()
+        self.scheduler = scheduler
+        
+        async def handler(websocket, path=None):
+            # 所有回复都经由发送通道，处理消息的协程从不等待慢客户端，取消等指令可及时响应
+            channel = scheduler.connect(websocket)
             try:
                 async for message in websocket:
                     data = json.loads(message)
-                    if data['action'] == 'process':
-                        await self.process_data(data, websocket)
+                    action = data.get('action')
+                    try:
+                        if action == 'process':
+                            # 提交任务，提交者自动订阅进度
+                            job_id = scheduler.submit(data, data.get('priority', 'normal'), websocket)
+                            channel.put({
+                                'type': 'job',
+                                'jobId': job_id,
+                                'status': '已加入队列'
+                            })
+                        elif action == 'subscribe':
+                            scheduler.subscribe(data['jobId'], websocket)
+                        elif action == 'cancel':
+                            scheduler.cancel(data['jobId'])
+                        elif action == 'list':
+                            channel.put({
+                                'type': 'jobs',
+                                'jobs': scheduler.list_jobs()
+                            })
+                        elif action == 'ping':
+                            channel.put({'type': 'pong', 'time': time.time()})
+                        else:
+                            raise ValueError(f"不支持的操作: {action}")
+                    except (ValueError, KeyError) as e:
+                        channel.put({
+                            'type': 'error',
+                            'jobId': data.get('jobId'),
+                            'error': str(e)
+                        })
             except Exception as e:
                 print(f"WebSocket错误: {e}")
+            finally:
+                scheduler.disconnect(websocket)
         
         server = await websockets.serve(handler, 'localhost', port)
         return server
     
-    async def process_data(self, data, websocket):
-        """处理数据"""
-        try:
-            # 初始化
-            self.is_processing = True
-            self.stop_event = asyncio.Event()
-            
-            # 初始化数据库
-            self.init_db()
-            
-            # 发送初始化完成
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': '初始化完成',
-                'percentage': 0
-            }))
-            
-            # 导入数据集A
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': '导入数据集A',
-                'percentage': 10
-            }))
-            
-            total_a = self.import_files(
-                data['filesA'], 
-                'table_a',
-                lambda progress: asyncio.create_task(
-                    websocket.send(json.dumps({
-                        'type': 'import',
-                        'data': progress,
-                        'percentage': 10 + min(progress.get('processed', 0) / 10000000 * 30, 30)
-                    }))
-                )
-            )
-            
-            # 去重数据集A
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': '去重数据集A',
-                'percentage': 40
-            }))
-            
-            deduped_a = self.deduplicate('table_a')
-            
-            # 导入数据集B
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': '导入数据集B',
-                'percentage': 50
-            }))
-            
-            total_b = self.import_files(
-                data['filesB'], 
-                'table_b',
-                lambda progress: asyncio.create_task(
-                    websocket.send(json.dumps({
-                        'type': 'import',
-                        'data': progress,
-                        'percentage': 50 + min(progress.get('processed', 0) / 10000000 * 30, 30)
-                    }))
-                )
-            )
-            
-            # 去重数据集B
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': '去重数据集B',
-                'percentage': 80
-            }))
-            
-            deduped_b = self.deduplicate('table_b')
-            
-            # 执行交并差运算
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': '执行运算',
-                'percentage': 85
-            }))
-            
-            result_count = self.process_operation('table_a', 'table_b', data['operation'])
-            
-            # 导出结果
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': '导出结果',
-                'percentage': 90
-            }))
-            
-            exported = self.export_result(
-                data['outputPath'], 
-                data['exportFormat'],
-                lambda progress: asyncio.create_task(
-                    websocket.send(json.dumps({
-                        'type': 'export',
-                        'data': progress,
-                        'percentage': 90 + min(progress.get('processed', 0) / progress.get('total', 1) * 10, 10)
-                    }))
-                )
-            )
-            
-            # 完成
-            await websocket.send(json.dumps({
-                'type': 'complete',
-                'status': '处理完成',
-                'percentage': 100,
-                'stats': {
-                    'totalA': total_a,
-                    'dedupedA': deduped_a,
-                    'totalB': total_b,
-                    'dedupedB': deduped_b,
-                    'resultCount': result_count,
-                    'exported': exported
-                }
-            }))
-            
-        except Exception as e:
-            await websocket.send(json.dumps({
-                'type': 'error',
-                'error': str(e)
-            }))
-        finally:
-            self.close_db()
-            self.is_processing = False
-            if self.stop_event:
-                self.stop_event.set()
-    
     def stop_processing(self):
-        """停止处理"""
+        """停止处理，并中断正在执行的SQL（可从其他线程调用）"""
         if self.stop_event:
             self.stop_event.set()
         self.is_processing = False
+        if self.conn:
+            try:
+                self.conn.interrupt()
+            except sqlite3.ProgrammingError:
+                # 连接已关闭
+                pass
@@ -0,0 +1,390 @@
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from data_processor import DataProcessor, SPLIT_REGIONS, split_output_path
+
+# 任务优先级，数值越小越先执行
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+# 可合并的进度消息类型：客户端来不及接收时只保留每个任务的最新一条
+COALESCED_TYPES = ['status', 'import', 'export']
+HEARTBEAT_INTERVAL = 5  # 秒，连接空闲时发送心跳
+PROGRESS_QUEUE_SIZE = 1000  # 子进程进度队列的容量，满时丢弃过时的进度消息
+CANCEL_POLL_INTERVAL = 0.5  # 秒，子进程检查取消标记的间隔
+MAX_FINISHED_JOBS = 100  # 保留状态的已结束任务数，超出时删除最早结束的
+FINISHED_STATUSES = ['completed', 'cancelled', 'failed']
+
+
+class JobCancelled(Exception):
+    """任务被用户取消"""
+
+
+def coalesce_key(message, sequence):
+    """合并键：可合并的进度消息每个任务一个键（新消息原位替换旧消息），其他消息各自一个键"""
+    if message.get('type') in COALESCED_TYPES:
+        return ('progress', message.get('jobId'))
+    return ('message', next(sequence))
+
+
+def watch_cancel(job_id, cancel_flags, processor, done):
+    """子进程中的取消监视线程：出现取消标记时中断正在执行的SQL（去重、运算等长语句不会回报进度）"""
+    while not done.wait(CANCEL_POLL_INTERVAL):
+        try:
+            cancelled = cancel_flags.get(job_id)
+        except (EOFError, OSError):
+            # 主进程已关闭
+            break
+        if cancelled:
+            processor.stop_processing()
+            break
+
+
+def run_job(job_id, data, progress_queue, cancel_flags):
+    """在子进程中执行一个任务
+
+    每个任务使用独立的 DataProcessor 和临时数据库，表名固定也不会与其他任务冲突。
+    进度通过 progress_queue 发回主进程，cancel_flags 中出现本任务ID时中止：
+    回报进度时检查，监视线程另外定期检查并中断正在执行的SQL。
+    """
+    processor = DataProcessor()
+    processor.is_processing = True
+    done = threading.Event()
+
+    def check_cancel():
+        if cancel_flags.get(job_id):
+            processor.stop_processing()
+            raise JobCancelled(f"任务已取消: {job_id}")
+
+    def report(message_type, percentage, **fields):
+        check_cancel()
+        message = {'jobId': job_id, 'type': message_type, 'percentage': percentage}
+        message.update(fields)
+        if message_type in COALESCED_TYPES:
+            try:
+                progress_queue.put_nowait(message)
+            except queue.Full:
+                # 主进程来不及转发时丢弃这条进度，下一条会带上最新值，任务不因此变慢
+                pass
+        else:
+            progress_queue.put(message)
+
+    def progress_callback(message_type, start, span, total=None):
+        def callback(progress):
+            processed = progress.get('processed', 0)
+            rows_done = processed / (total or progress.get('total') or 10000000)
+            report(message_type, start + min(rows_done * span, span), data=progress)
+        return callback
+
+    try:
+        processor.init_db()
+        threading.Thread(target=watch_cancel, args=(job_id, cancel_flags, processor, done), daemon=True).start()
+        report('status', 0, status='初始化完成')
+
+        # 导入并去重数据集A
+        report('status', 10, status='导入数据集A')
+        total_a = processor.import_files(data['filesA'], 'table_a', progress_callback('import', 10, 30, 10000000))
+        report('status', 40, status='去重数据集A')
+        deduped_a = processor.deduplicate('table_a')
+
+        # 导入并去重数据集B
+        report('status', 50, status='导入数据集B')
+        total_b = processor.import_files(data['filesB'], 'table_b', progress_callback('import', 50, 30, 10000000))
+        report('status', 80, status='去重数据集B')
+        deduped_b = processor.deduplicate('table_b')
+
+        # 执行交并差运算
+        report('status', 85, status='执行运算')
+        result_count = processor.process_operation('table_a', 'table_b', data['operation'])
+
+        # 导出结果
+        report('status', 90, status='导出结果')
+        if data['operation'] == 'split':
+            # 拆分运算：每个区域单独导出一个文件，预览按区域给出
+            exported = 0
+            output_files = []
+            preview = {}
+            for region, table in SPLIT_REGIONS.items():
+                region_path = split_output_path(data['outputPath'], region)
+                exported += processor.export_result(
+                    region_path,
+                    data['exportFormat'],
+                    progress_callback('export', 90, 10),
+                    table_name=table
+                )
+                output_files.append(region_path)
+                preview[region] = processor.preview_result(table_name=table)
+        else:
+            exported = processor.export_result(
+                data['outputPath'],
+                data['exportFormat'],
+                progress_callback('export', 90, 10)
+            )
+            output_files = [data['outputPath']]
+            # 清理工作库前生成结果预览，随完成消息发给客户端
+            preview = processor.preview_result()
+
+        return {
+            'totalA': total_a,
+            'dedupedA': deduped_a,
+            'totalB': total_b,
+            'dedupedB': deduped_b,
+            'resultCount': result_count,
+            'exported': exported,
+            'outputFiles': output_files,
+            'preview': preview
+        }
+    except Exception:
+        # 被中断的SQL抛出的错误按取消处理
+        if cancel_flags.get(job_id):
+            raise JobCancelled(f"任务已取消: {job_id}") from None
+        raise
+    finally:
+        done.set()
+        processor.close_db()
+        processor.is_processing = False
+
+
+class ClientChannel:
+    """单个WebSocket连接的发送通道
+
+    消息先进入待发送缓冲区，由独立协程依次发送；慢客户端只会让自己的进度消息被合并，
+    不会阻塞事件循环或其他客户端。完成、错误等消息不合并，保证送达。
+    """
+
+    def __init__(self, websocket, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.websocket = websocket
+        self.heartbeat_interval = heartbeat_interval
+        self.pending = OrderedDict()  # 合并键 -> 消息，保持到达顺序
+        self.sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, message):
+        """加入待发送消息（非阻塞）"""
+        if self.closed:
+            return
+        # 同一任务的进度消息原位替换为最新值
+        self.pending[coalesce_key(message, self.sequence)] = message
+        self.wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self.task.cancel()
+
+    async def _run(self):
+        try:
+            while not self.closed:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    await self.websocket.send(json.dumps({'type': 'heartbeat', 'time': time.time()}))
+                    continue
+                self.wakeup.clear()
+                while self.pending:
+                    _, message = self.pending.popitem(last=False)
+                    await self.websocket.send(json.dumps(message, ensure_ascii=False))
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # 连接已断开，丢弃剩余消息
+            self.closed = True
+
+
+class JobScheduler:
+    """WebSocket 后端的任务调度器
+
+    任务按优先级排队，在有界进程池中并行执行；客户端按任务ID订阅进度。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.jobs = {}  # 任务ID -> 任务信息
+        self.subscribers = {}  # 任务ID -> 订阅的 websocket 集合
+        self.channels = {}  # websocket -> ClientChannel
+        self.sequence = itertools.count()  # 同优先级按提交顺序执行
+        self.queue = None
+        self.pool = None
+        self.manager = None
+        self.progress_queue = None
+        self.cancel_flags = None
+        self.tasks = []
+        self.relay_thread = None
+
+    async def start(self):
+        """启动进程池、调度协程和进度转发线程"""
+        # 子进程使用 spawn 启动：事件循环、转发线程和 Manager 运行时 fork 可能继承被占用的锁而死锁
+        context = multiprocessing.get_context('spawn')
+        self.queue = asyncio.PriorityQueue()
+        self.manager = context.Manager()
+        self.progress_queue = self.manager.Queue(PROGRESS_QUEUE_SIZE)
+        self.cancel_flags = self.manager.dict()
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        self.tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.max_workers)]
+        self.relay_thread = threading.Thread(
+            target=self._relay_progress, args=(asyncio.get_running_loop(),), daemon=True
+        )
+        self.relay_thread.start()
+
+    async def shutdown(self):
+        """取消所有任务并关闭进程池"""
+        for job_id, job in self.jobs.items():
+            if job['status'] in ['queued', 'running']:
+                self.cancel_flags[job_id] = True
+        self.progress_queue.put(None)
+        for task in self.tasks:
+            task.cancel()
+        for channel in self.channels.values():
+            channel.close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.manager.shutdown()
+
+    def submit(self, data, priority='normal', websocket=None):
+        """提交任务，返回任务ID；提交任务的客户端自动订阅其进度"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"不支持的优先级: {priority}，支持的优先级: {', '.join(PRIORITIES)}")
+        for key in ['filesA', 'filesB', 'operation', 'outputPath', 'exportFormat']:
+            if key not in data:
+                raise ValueError(f"缺少参数: {key}")
+
+        job_id = uuid.uuid4().hex[:12]
+        self.jobs[job_id] = {
+            'jobId': job_id,
+            'status': 'queued',
+            'priority': priority,
+            'operation': data['operation'],
+            'submitted': time.time(),
+            'data': data
+        }
+        if websocket is not None:
+            self.subscribe(job_id, websocket)
+        self.queue.put_nowait((PRIORITIES[priority], next(self.sequence), job_id))
+        return job_id
+
+    def connect(self, websocket):
+        """客户端连接时创建其发送通道"""
+        channel = ClientChannel(websocket)
+        self.channels[websocket] = channel
+        return channel
+
+    def disconnect(self, websocket):
+        """客户端断开时关闭发送通道并取消其全部订阅"""
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            channel.close()
+        for subscribers in self.subscribers.values():
+            subscribers.discard(websocket)
+
+    def subscribe(self, job_id, websocket):
+        """订阅任务进度"""
+        if job_id not in self.jobs:
+            raise ValueError(f"任务不存在: {job_id}")
+        self.subscribers.setdefault(job_id, set()).add(websocket)
+
+    def cancel(self, job_id):
+        """取消任务：排队中的任务不再执行，运行中的任务在下一次进度回报时中止"""
+        job = self.jobs.get(job_id)
+        if not job:
+            raise ValueError(f"任务不存在: {job_id}")
+        if job['status'] in ['queued', 'running']:
+            self.cancel_flags[job_id] = True
+            if job['status'] == 'queued':
+                job['status'] = 'cancelled'
+
+    def list_jobs(self):
+        """返回全部任务的状态（不含请求参数）"""
+        return [{k: v for k, v in job.items() if k != 'data'} for job in self.jobs.values()]
+
+    def publish(self, job_id, message):
+        """把消息放入订阅了该任务的客户端的发送通道（非阻塞），已断开的连接自动移除"""
+        for websocket in list(self.subscribers.get(job_id, ())):
+            channel = self.channels.get(websocket)
+            if channel is None or channel.closed:
+                self.subscribers[job_id].discard(websocket)
+                continue
+            channel.put(message)
+
+    async def _dispatch(self):
+        """调度协程：从优先队列取任务，交给进程池执行"""
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id = await self.queue.get()
+            job = self.jobs[job_id]
+            if job['status'] == 'cancelled':
+                job['finished'] = time.time()
+                self.cancel_flags.pop(job_id, None)
+                self.publish(job_id, {'jobId': job_id, 'type': 'cancelled', 'status': '任务已取消'})
+                self._forget_finished(job)
+                continue
+
+            job['status'] = 'running'
+            job['started'] = time.time()
+            try:
+                stats = await loop.run_in_executor(
+                    self.pool, run_job, job_id, job['data'], self.progress_queue, self.cancel_flags
+                )
+                job['status'] = 'completed'
+                # 预览只随完成消息发送一次，任务列表中不保留
+                job['stats'] = {k: v for k, v in stats.items() if k != 'preview'}
+                message = {'jobId': job_id, 'type': 'complete', 'status': '处理完成', 'percentage': 100, 'stats': stats}
+            except JobCancelled:
+                job['status'] = 'cancelled'
+                message = {'jobId': job_id, 'type': 'cancelled', 'status': '任务已取消'}
+            except Exception as e:
+                if self.cancel_flags.get(job_id):
+                    job['status'] = 'cancelled'
+                    message = {'jobId': job_id, 'type': 'cancelled', 'status': '任务已取消'}
+                else:
+                    job['status'] = 'failed'
+                    job['error'] = str(e)
+                    message = {'jobId': job_id, 'type': 'error', 'error': str(e)}
+            finally:
+                job['finished'] = time.time()
+                self.cancel_flags.pop(job_id, None)
+            self.publish(job_id, message)
+            self._forget_finished(job)
+
+    def _forget_finished(self, job):
+        """任务结束后释放其请求参数，只保留最近 MAX_FINISHED_JOBS 个已结束任务的状态和订阅"""
+        job.pop('data', None)
+        finished = sorted(
+            (job for job in self.jobs.values() if job['status'] in FINISHED_STATUSES),
+            key=lambda job: job.get('finished', 0)
+        )
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job['jobId']]
+            self.subscribers.pop(job['jobId'], None)
+
+    def _relay_progress(self, loop):
+        """转发线程：取出队列中已到达的全部进度，同一任务的进度只保留最新一条，整批线程安全地交给事件循环分发"""
+        sequence = itertools.count()
+        while True:
+            try:
+                messages = [self.progress_queue.get()]
+                while len(messages) < PROGRESS_QUEUE_SIZE:
+                    messages.append(self.progress_queue.get_nowait())
+            except queue.Empty:
+                pass
+            except (EOFError, OSError):
+                break
+            batch = OrderedDict()
+            for message in messages:
+                if message is None:
+                    break
+                batch[coalesce_key(message, sequence)] = message
+            loop.call_soon_threadsafe(self._publish_batch, list(batch.values()))
+            if None in messages:
+                break
+
+    def _publish_batch(self, messages):
+        """在事件循环中分发转发线程交来的一批消息"""
+        for message in messages:
+            self.publish(message['jobId'], message)
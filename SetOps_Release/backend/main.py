@@ -1,6 +1,7 @@
 import sys
 import os
 import asyncio
+import multiprocessing
 from data_processor import DataProcessor
 
 # 添加当前目录到路径
@@ -12,6 +13,7 @@ async def main():
     print("=====================================")
     print("正在启动...")
     
+    processor = None
     try:
         # 创建数据处理器
         processor = DataProcessor()
@@ -29,7 +31,12 @@ async def main():
     except Exception as e:
         print(f"错误: {e}")
     finally:
+        # 取消未完成的任务并关闭进程池
+        if processor and getattr(processor, 'scheduler', None):
+            await processor.scheduler.shutdown()
         print("程序已退出")
 
 if __name__ == "__main__":
+    # 打包后的程序在进程池子进程中需要
+    multiprocessing.freeze_support()
     asyncio.run(main())
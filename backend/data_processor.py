@@ -1,61 +1,1195 @@
-import pandas as pd
-import numpy as np
 import sqlite3
 import os
 import tempfile
 import time
-import psutil
 import logging
-from concurrent.futures import ThreadPoolExecutor
-
-# 配置日志记录
-temp_dir = tempfile.gettempdir()
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(temp_dir, 'setops_backend.log')),
-        logging.StreamHandler()
-    ]
-)
+import json
+import shutil
+import hashlib
+import re
+import sys
+import multiprocessing
+import queue
+import threading
+import zipfile
+import zlib
+import codecs
+import csv
+import gzip
+import bz2
+import lzma
+import random
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# pandas/numpy/psutil 导入耗时数秒（打包后更慢），推迟到第一次创建 DataProcessor 时再导入，
+# 使界面可以先显示出来
+pd = None
+np = None
+psutil = None
+
 logger = logging.getLogger('DataProcessor')
-logger.info(f"后端日志文件将保存到: {os.path.join(temp_dir, 'setops_backend.log')}")
+
+
+def load_dependencies():
+    """导入重量级依赖并配置日志记录，只在第一次调用时执行"""
+    global pd, np, psutil
+    if pd is not None:
+        return
+    
+    # 配置日志记录
+    temp_dir = tempfile.gettempdir()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(temp_dir, 'setops_backend.log')),
+            logging.StreamHandler()
+        ]
+    )
+    logger.info(f"后端日志文件将保存到: {os.path.join(temp_dir, 'setops_backend.log')}")
+    
+    start_time = time.perf_counter()
+    import pandas
+    import numpy
+    import psutil as psutil_module
+    pd, np, psutil = pandas, numpy, psutil_module
+    logger.info(f"加载数据处理依赖耗时: {time.perf_counter() - start_time:.2f} 秒")
+
+# 拆分运算（split）的维恩区域及其结果表
+SPLIT_REGIONS = {
+    'differenceAB': 'result_a_only',
+    'intersection': 'result_both',
+    'differenceBA': 'result_b_only'
+}
+
+# SQLite调优档案：临时库用完即删，同步可关闭；回滚日志放在内存中而不关闭，
+# 出错和取消（interrupt）时依赖回滚，journal_mode=OFF 时回滚的行为未定义
+# cache_size 为负数时单位为KB；mmap_size 单位为字节
+SQLITE_PROFILES = {
+    'low_memory': {  # 低内存笔记本（8GB以下）
+        'page_size': 4096,
+        'cache_size': -16000,
+        'mmap_size': 0,
+        'temp_store': 'FILE',
+        'journal_mode': 'MEMORY',
+        'synchronous': 'OFF',
+        'locking_mode': 'EXCLUSIVE'
+    },
+    'balanced': {  # 常规办公电脑
+        'page_size': 8192,
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'FILE',
+        'journal_mode': 'MEMORY',
+        'synchronous': 'OFF',
+        'locking_mode': 'EXCLUSIVE'
+    },
+    'big_server': {  # 大内存分析服务器（32GB以上）
+        'page_size': 16384,
+        'cache_size': -2000000,
+        'mmap_size': 16 * 1024 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'journal_mode': 'MEMORY',
+        'synchronous': 'OFF',
+        'locking_mode': 'EXCLUSIVE'
+    }
+}
+
+# 自动调优时缓存大小的上限（KB），低内存档案不随可用内存放大
+AUTO_CACHE_LIMITS = {
+    'low_memory': 16000,
+    'balanced': 256000,
+    'big_server': 4000000
+}
+
+# 临时数据库位置
+SCRATCH_DIR_ENV = 'SETOPS_SCRATCH_DIR'  # 未指定 scratch_dir 时读取的环境变量
+SHM_DIR = '/dev/shm'  # Linux 内存文件系统，可被其他连接按路径打开
+WORK_DB_SIZE_FACTOR = 3  # 工作库大小估算：原始表 + 去重表 + 结果表约为输入的3倍
+MEMORY_MODE_RATIO = 0.25  # 估算大小不超过可用内存的1/4时自动使用内存模式
+JOBS_DIR_NAME = 'setops_jobs'  # 可恢复任务的工作库目录（位于 scratch_dir 下）
+JOB_MAX_AGE = 7 * 24 * 3600  # 秒，超过该时长未更新的可恢复任务工作库视为废弃，启动时删除
+EXPORT_CHECKPOINT_BYTES = 64 * 1024 * 1024  # 可恢复的CSV/TXT导出每写出这么多字符记录一次检查点（压缩输出需结束当前帧）
+DELTA_DIR_NAME = 'setops_delta'  # 增量库目录（位于 scratch_dir 下），长期保留
+
+# 取消检查：每执行这么多条SQLite虚拟机指令回调一次进度处理器（约亚毫秒级）
+CANCEL_CHECK_INTERVAL = 10000
+
+# 列类型推断
+SCHEMA_SAMPLE_ROWS = 10000  # 推断时采样首个数据块的行数
+SCHEMA_FILE_NAME = 'setops_schema.json'  # 数据集目录下的列类型覆盖配置
+# 规范化规则：整数不允许前导零（如 "007" 保留为 TEXT，避免与 "7" 混淆），
+# 最多18位以保证落在64位整数范围内；浮点数有效位数不超过15位，避免精度丢失
+INTEGER_PATTERN = r'-?(?:0|[1-9]\d{0,17})'
+REAL_PATTERN = r'-?(?:0|[1-9]\d{0,14})\.\d{1,15}(?:[eE][-+]?\d{1,3})?'
+COLUMN_TYPES = ['INTEGER', 'REAL', 'TEXT']
+# 已有表中按数值亲和存储的声明类型（CREATE TABLE ... AS SELECT 把 INTEGER 记为 INT），导入时检查有损值
+NUMERIC_DECLARED_TYPES = {'INTEGER': 'INTEGER', 'INT': 'INTEGER', 'REAL': 'REAL'}
+
+# 比较规则（F012）：导入时把各列按规则规范化后拼成键存入 NORMALIZED_KEY_COLUMN，
+# 去重和运算在键的主键索引上进行，输出的仍是原始行
+NORMALIZATION_RULES = {
+    'ignore_case': '忽略大小写',
+    'trim': '去除首尾空白',
+    'leading_zeros': '忽略前导零',
+    'fullwidth': '全角转半角'
+}
+NORMALIZED_KEY_COLUMN = '_key'
+KEY_SEPARATOR = '\x1f'  # 键中各列之间的分隔符（ASCII 单元分隔符）
+KEY_NULL = '\x00'  # 键中的NULL标记，与空字符串区分
+LEADING_ZEROS = re.compile(r'^([-+]?)0+(?=\d+(?:\.\d+)?$)')  # 只处理数字形式的值，如 007、-0012.5
+FULLWIDTH_TABLE = {0x3000: 0x20, **{code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}}  # 全角空格和ASCII字符
+
+# 探测模式：两个数据集大小悬殊时，只导入小数据集并装入内存哈希集合，大数据集从文件流式读取逐行查找，不写入SQLite
+PROBE_OPERATIONS = {'intersection': ['table_a', 'table_b'], 'differenceAB': ['table_a'], 'differenceBA': ['table_b']}  # 运算 -> 可作为小数据集的一侧
+PROBE_SIZE_RATIO = 20  # 大数据集的输入至少是小数据集的这么多倍时使用探测模式
+PROBE_MEMORY_FACTOR = 8  # 哈希集合占用的内存约为小数据集文本大小的倍数（元组、字符串对象和集合槽位）
+SQLITE_NUMBER = re.compile(r'[ \t\n\v\f\r]*[-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?[ \t\n\v\f\r]*')  # SQLite 可转换为数值的文本（仅ASCII）
+INT64_RANGE = (-2 ** 63, 2 ** 63)
+EXACT_INTEGER = re.compile(r'0|-?[1-9]\d{0,17}')  # 存入 INTEGER 列后原样读出的整数文本
+
+# 增量模式：保留各数据集去重后的行、每个分片包含的行和分片指纹，再次运行时只读取新增和变化的分片
+DELTA_SIDES = {'table_a': 1, 'table_b': 2}  # 数据集 -> 标记位，某个键在两侧出现的标记位之和即其维恩区域
+OPERATION_REGIONS = {  # 运算 -> 结果包含的区域：1 = 仅A，2 = 仅B，3 = 两者都有
+    'intersection': [3], 'union': [1, 2, 3], 'differenceAB': [1], 'differenceBA': [2], 'symmetricDifference': [1, 2]
+}
+ROW_KEY_COLUMN = '_row'  # 启用比较规则时原始行的键，与规范化键一起区分不同的原始行
+DELTA_STORE_VERSION = 2  # 增量库表结构版本，与库中记录的不同时重建
+# 增量库行表的内部列，数据集的列不能使用这些列名
+DELTA_RESERVED_COLUMNS = ['_id', '_side', '_refs', NORMALIZED_KEY_COLUMN, ROW_KEY_COLUMN]
+
+# 输入格式：压缩文件按最后一个扩展名识别压缩方式，其前的扩展名决定数据格式（如 .csv.gz）
+COLUMNAR_EXTENSIONS = ['.parquet', '.arrow', '.feather']  # 列式格式，由 pyarrow 按记录批读取
+DATA_EXTENSIONS = ['.csv', '.xlsx', '.xls', '.txt'] + COLUMNAR_EXTENSIONS
+TEXT_EXTENSIONS = ['.csv', '.txt']  # 可流式解压的数据格式
+PARQUET_BATCH_ROWS = 65536  # 从 Parquet 行组中每次解码的行数
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.zst': 'zstd', '.bz2': 'bz2', '.xz': 'xz'}
+ARCHIVE_EXTENSION = '.zip'  # 分片归档，每个成员是一个 CSV/TXT 分片
+COMPRESSED_SIZE_FACTOR = 5  # 估算工作库大小时，压缩输入按解压后约为压缩大小的5倍计
+ARCHIVE_PREFETCH_CHUNKS = 2  # 每个归档成员最多预先解析的数据块数
+
+# CSV/TXT 格式探测：只读取文件开头，不额外完整读一遍
+SNIFF_BYTES = 256 * 1024  # 探测编码时读取的字节数
+SNIFF_LINES = 100  # 探测分隔符、引号和表头时使用的行数
+SNIFF_ENCODINGS = ['utf-8', 'gb18030']  # 无BOM时依次尝试，GB18030 兼容 GBK/GB2312
+SNIFF_DELIMITERS = ',\t;|'  # 候选分隔符
+FORMAT_FILE_NAME = 'setops_formats.json'  # 数据集目录下按文件名的格式覆盖配置，"*" 对目录内所有文件生效
+FORMAT_OPTIONS = ['encoding', 'delimiter', 'quotechar', 'header']
+
+# 列式导出：每批查询结果写为一个 Parquet 行组 / Arrow 记录批
+COLUMNAR_FORMATS = ['parquet', 'arrow']
+COLUMNAR_COMPRESSIONS = {
+    'parquet': ['zstd', 'snappy', 'gzip', 'brotli', 'lz4', 'none'],
+    'arrow': ['zstd', 'lz4', 'none']
+}
+DEFAULT_COLUMNAR_COMPRESSION = 'zstd'
+
+# 分片导出：output_path 为 dir/name.ext 时分片为 dir/name_00001.ext，清单为 dir/name_manifest.json
+SHARD_NAME_FORMAT = '{base}_{index:05d}{ext}'
+MANIFEST_SUFFIX = '_manifest.json'
+XLSX_MAX_ROWS = 1048575  # Excel 单个工作表的最大数据行数（不含表头）
+
+# CSV/TXT 压缩导出
+TEXT_COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}  # 压缩方式 -> 追加的文件后缀
+COMPRESS_BLOCK_BYTES = 1024 * 1024  # 文本攒够这么多字节后交给压缩线程
+COMPRESS_QUEUE_BLOCKS = 8  # 等待压缩的块数上限，写入快于压缩时阻塞调用方
+
+# 并行导出单个 CSV/TXT 文件
+PARALLEL_PARTS_PER_WORKER = 4  # 每个进程分到的区间数，区间多一些负载更均衡、进度更细
+PARALLEL_MIN_PART_ROWS = 50000  # 每个区间的最少行数，结果太小时不值得启动进程
+PART_NAME_FORMAT = '{path}.part{index:05d}'  # 临时分块文件名，合并后删除
+
+# 结果预览（F017）：导出后、清理工作库前的有界查询
+PREVIEW_ROWS = 100  # 首尾各预览的行数
+PREVIEW_SAMPLE_ROWS = 100  # 随机抽样的行数
+PREVIEW_STATS_ROWS = 200000  # 列统计最多扫描的行数，超出时分块抽样统计
+PREVIEW_STATS_BLOCKS = 100  # 抽样统计的数据块数
+
+# 自适应批量：按每行实测字节数把单个数据块控制在内存预算的一小部分内
+MEMORY_BUDGET_MB = 1024  # NF005：内存占用峰值上限
+BATCH_MEMORY_RATIO = 0.05  # 单个数据块占内存预算的比例（转为Python对象后会膨胀数倍，需留足余量）
+RSS_HIGH_WATER_RATIO = 0.8  # 进程RSS超过预算的该比例时批量减半
+PROBE_BATCH_SIZE = 10000  # 首个数据块的行数，用于测量行宽
+MIN_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 200000
+IMPORT_COMMIT_ROWS = 1000000  # 导入时每插入这么多行提交一次事务
+ROW_SAMPLE_SIZE = 1000  # 估算查询结果行宽时采样的行数
+
+# 内存调控
+SQLITE_MEMORY_RATIO = 0.25  # SQLite页缓存和内存映射各自最多占内存预算的比例
+PRESSURE_CACHE_KB = 2000  # 内存紧张时页缓存降到的大小
+XLSX_CELL_BYTES = 300  # openpyxl 常规模式下每个单元格约占的内存
+
+
+def split_input_extension(file_path):
+    """返回 (数据格式扩展名, 压缩方式)，如 ('.csv', 'gzip')；zip 归档返回 (None, 'zip')，不支持时返回 (None, None)"""
+    base, ext = os.path.splitext(file_path.lower())
+    if ext == ARCHIVE_EXTENSION:
+        return None, 'zip'
+    if ext in COMPRESSION_EXTENSIONS:
+        data_ext = os.path.splitext(base)[1]
+        return (data_ext, COMPRESSION_EXTENSIONS[ext]) if data_ext in TEXT_EXTENSIONS else (None, None)
+    return (ext, None) if ext in DATA_EXTENSIONS else (None, None)
+
+
+def is_supported_input(file_path):
+    """是否为可导入的文件（含压缩文件和 zip 分片归档）"""
+    return split_input_extension(file_path) != (None, None)
+
+
+def input_extension(file_path):
+    """文件的完整扩展名，如 .csv.gz"""
+    data_ext, compression = split_input_extension(file_path)
+    if compression and data_ext:
+        return data_ext + os.path.splitext(file_path)[1].lower()
+    return os.path.splitext(file_path)[1].lower()
+
+
+def normalize_values(values, rules):
+    """按比较规则规范化一列字符串
+    
+    逐值处理对象数组比 pandas 的 .str 方法快得多；缺失值已替换为 KEY_NULL，各规则对它都不起作用。
+    """
+    if 'fullwidth' in rules:
+        values = [v if v.isascii() else v.translate(FULLWIDTH_TABLE) for v in values]
+    if 'trim' in rules:
+        values = [v.strip() for v in values]
+    if 'ignore_case' in rules:
+        values = [v.casefold() for v in values]
+    if 'leading_zeros' in rules:
+        values = [LEADING_ZEROS.sub(r'\1', v) if v[:1] in ('0', '-', '+') else v for v in values]
+    return values
+
+
+def normalized_keys(chunk, key_positions, rules):
+    """计算数据块每行的规范化键；key_positions 按键的列顺序给出数据块中的列位置，文件缺少的列为None"""
+    columns = [
+        normalize_values(chunk.iloc[:, position].to_numpy(dtype=object, na_value=KEY_NULL), rules)
+        if position is not None else [KEY_NULL] * len(chunk)
+        for position in key_positions
+    ]
+    return list(map(KEY_SEPARATOR.join, zip(*columns)))
+
+
+def affinity_value(value, column_type):
+    """按 SQLite 的类型亲和规则转换一个文本值，与该值插入 INTEGER/REAL 列后读出的结果相同
+    
+    INTEGER 列：整数字面量转为整数（超出64位时为浮点数），可无损表示为整数的实数也转为整数；
+    REAL 列：数值文本转为浮点数；其他文本和 TEXT 列保持原样。
+    """
+    if value is None or column_type not in ('INTEGER', 'REAL') or not SQLITE_NUMBER.fullmatch(value):
+        return value
+    number = float(value)
+    if column_type == 'REAL':
+        return number
+    if value.strip().lstrip('+-').isdigit():
+        integer = int(value)
+        return integer if INT64_RANGE[0] <= integer < INT64_RANGE[1] else number
+    return int(number) if number.is_integer() and INT64_RANGE[0] <= number < INT64_RANGE[1] else number
+
+
+def stored_value(value, column_type):
+    """值存入 INTEGER/REAL 列后读出的结果；转换后不能还原为原文本的值（如 "0123" 读出为 123）返回原文本，
+    与导入时把该列改为 TEXT 后存储的值一致
+    """
+    converted = affinity_value(value, column_type)
+    return converted if converted is value or str(converted) == value else value
+
+
+def lossy_value(values, column_type):
+    """返回存入 INTEGER/REAL 列后不能原样读出的第一个值（如 "0123" 存为 123，"1.50" 存为 1.5），都能还原时返回None"""
+    # 先用规范整数的正则和浮点数往返筛掉绝大多数无损值，其余值按 SQLite 的转换规则逐个判断
+    if column_type == 'INTEGER':
+        exact = EXACT_INTEGER.fullmatch
+        candidates = [value for value in values if value is not None and not exact(value)]
+    else:
+        candidates = []
+        for value in values:
+            if value is None:
+                continue
+            try:
+                if repr(float(value)) == value:
+                    continue
+            except ValueError:
+                pass
+            candidates.append(value)
+    for value in candidates:
+        converted = affinity_value(value, column_type)
+        if converted is not value and str(converted) != value:
+            return value
+    return None
+
+
+def row_keys(columns):
+    """按列的值（已做类型转换）计算每行的原始行键，值相同的行键相同；columns 为各列的值列表"""
+    return [KEY_SEPARATOR.join(KEY_NULL if v is None else str(v) for v in row) for row in zip(*columns)]
+
+
+def remove_stale_jobs(scratch_dir=None, max_age=JOB_MAX_AGE):
+    """删除 scratch_dir 下超过 max_age 秒未更新的可恢复任务工作库（连同WAL附属文件），返回删除的工作库数
+    
+    不加载 pandas 等依赖，可在程序启动时调用。
+    """
+    jobs_dir = os.path.join(scratch_dir or os.environ.get(SCRATCH_DIR_ENV) or tempfile.gettempdir(), JOBS_DIR_NAME)
+    if not os.path.isdir(jobs_dir):
+        return 0
+    removed = 0
+    now = time.time()
+    for name in os.listdir(jobs_dir):
+        if not name.endswith('.db'):
+            continue
+        paths = [os.path.join(jobs_dir, name + suffix) for suffix in ['', '-wal', '-shm', '-journal']]
+        try:
+            modified = max(os.path.getmtime(path) for path in paths if os.path.exists(path))
+            if now - modified < max_age:
+                continue
+            for path in paths:
+                if os.path.exists(path):
+                    os.unlink(path)
+            removed += 1
+        except OSError as e:
+            logger.warning(f"删除过期任务工作库失败 {name}: {e}")
+    if removed:
+        logger.info(f"删除 {removed} 个过期的任务工作库: {jobs_dir}")
+    return removed
+
+
+def archive_members(file_path):
+    """zip 归档中按名称排序的 CSV/TXT 成员"""
+    with zipfile.ZipFile(file_path) as archive:
+        return sorted(
+            info.filename for info in archive.infolist()
+            if not info.is_dir() and os.path.splitext(info.filename)[1].lower() in TEXT_EXTENSIONS
+        )
+
+
+def file_fingerprint(file_path):
+    """文件的路径、大小和修改时间，任一变化即视为不同的文件"""
+    try:
+        stat = os.stat(file_path)
+        return [os.path.abspath(file_path), stat.st_size, int(stat.st_mtime)]
+    except OSError:
+        return [os.path.abspath(file_path), None, None]
+
+
+def read_text_sample(file_path):
+    """读取 CSV/TXT 开头的 SNIFF_BYTES 字节（压缩文件读解压后的内容，zip 归档读第一个成员）"""
+    data_ext, compression = split_input_extension(file_path)
+    if compression == 'zip':
+        members = archive_members(file_path)
+        if not members:
+            return b''
+        with zipfile.ZipFile(file_path) as archive, archive.open(members[0]) as f:
+            return f.read(SNIFF_BYTES)
+    if compression == 'zstd':
+        import zstandard
+        with open(file_path, 'rb') as raw, zstandard.ZstdDecompressor().stream_reader(raw) as f:
+            return f.read(SNIFF_BYTES)
+    opener = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}.get(compression, open)
+    with opener(file_path, 'rb') as f:
+        return f.read(SNIFF_BYTES)
+
+
+def detect_encoding(sample):
+    """按 BOM 判断编码，无 BOM 时依次尝试 SNIFF_ENCODINGS，返回 (编码, 解码后的文本)"""
+    for bom, encoding in [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]:
+        if sample.startswith(bom):
+            return encoding, codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample)
+    for encoding in SNIFF_ENCODINGS:
+        try:
+            # 增量解码允许样本末尾截断半个字符
+            return encoding, codecs.getincrementaldecoder(encoding)().decode(sample)
+        except UnicodeDecodeError:
+            continue
+    return 'utf-8', sample.decode('utf-8', errors='replace')
+
+
+def sniff_text_format(sample, data_ext, complete=False):
+    """从文件开头的字节探测编码、分隔符、引号和是否有表头
+    
+    分隔符和引号由 csv.Sniffer 在候选分隔符中判断，判断不出时使用扩展名的默认值（.csv 逗号，.txt 制表符）；
+    首行某个字段是数字且该列其余行也都是数字时，认为没有表头。complete 表示样本已是整个文件。
+    """
+    encoding, text = detect_encoding(sample)
+    lines = text.splitlines(True)
+    if not complete and len(lines) > 1:
+        # 去掉可能被截断的最后一行
+        lines = lines[:-1]
+    head = ''.join(lines[:SNIFF_LINES])
+    detected = {'encoding': encoding, 'delimiter': '\t' if data_ext == '.txt' else ',', 'quotechar': '"', 'header': True}
+    try:
+        dialect = csv.Sniffer().sniff(head, delimiters=SNIFF_DELIMITERS)
+        detected['delimiter'] = dialect.delimiter
+        detected['quotechar'] = dialect.quotechar or '"'
+    except csv.Error:
+        pass
+    rows = [row for row in csv.reader(head.splitlines(), delimiter=detected['delimiter'], quotechar=detected['quotechar']) if row]
+    detected['columns'] = len(rows[0]) if rows else 0
+    if len(rows) > 1:
+        number = re.compile(f"(?:{INTEGER_PATTERN})|(?:{REAL_PATTERN})")
+        for index, value in enumerate(rows[0]):
+            column = [row[index] for row in rows[1:] if index < len(row) and row[index]]
+            if number.fullmatch(value.strip()) and column and all(number.fullmatch(v.strip()) for v in column):
+                detected['header'] = False
+                break
+    return detected
+
+
+class ArchiveReader:
+    """zip 分片归档的分块读取器
+    
+    每个成员由线程池并行解压、解析，解析好的数据块按成员顺序交给调用方；每个成员的缓冲队列有界，
+    解压不会远远领先于写入。接口与 pandas 的分块读取器一致（迭代或 get_chunk）。
+    """
+    
+    def __init__(self, file_path, batch_size, executor, open_member, **kwargs):
+        self.file_path = file_path
+        self.batch_size = batch_size
+        self.open_member = open_member
+        self.kwargs = kwargs
+        self.closed = False
+        self.members = archive_members(file_path)
+        if not self.members:
+            raise ValueError(f"归档中没有 CSV/TXT 文件: {os.path.basename(file_path)}")
+        logger.info(f"归档 {os.path.basename(file_path)} 包含 {len(self.members)} 个分片")
+        self.queues = [queue.Queue(maxsize=ARCHIVE_PREFETCH_CHUNKS) for _ in self.members]
+        # 线程池按提交顺序执行，前面的成员总是先被解压，不会因后面的成员占满线程而死锁
+        for member, member_queue in zip(self.members, self.queues):
+            executor.submit(self._read_member, member, member_queue)
+        self.chunks = self._iter_chunks()
+    
+    def _put(self, member_queue, item):
+        while not self.closed:
+            try:
+                member_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def _read_member(self, member, member_queue):
+        """工作线程：流式解压一个成员并逐块解析"""
+        try:
+            with zipfile.ZipFile(self.file_path) as archive, archive.open(member) as f:
+                data_ext = os.path.splitext(member)[1].lower()
+                reader = self.open_member(f, data_ext, self.batch_size, **self.kwargs)
+                while not self.closed:
+                    try:
+                        chunk = reader.get_chunk(self.batch_size)
+                    except StopIteration:
+                        break
+                    self._put(member_queue, chunk)
+        except Exception as e:
+            self._put(member_queue, ValueError(f"读取归档成员 {member} 失败: {e}"))
+        self._put(member_queue, None)
+    
+    def _iter_chunks(self):
+        for member_queue in self.queues:
+            while True:
+                item = member_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        try:
+            return next(self.chunks)
+        except BaseException:
+            self.close()
+            raise
+    
+    def get_chunk(self, size):
+        """取下一个数据块；新的批量大小从工作线程下一次读取时生效"""
+        self.batch_size = size
+        return next(self)
+    
+    def close(self):
+        """停止后台解压（调用方提前结束时释放被阻塞的工作线程）"""
+        self.closed = True
+
+
+def format_text_row(row, export_format):
+    """按 CSV（全部加引号）或 TXT（制表符分隔）格式序列化一行"""
+    if export_format == 'csv':
+        return ','.join(['"' + str(cell).replace('"', '""') + '"' if cell is not None else '' for cell in row]) + '\n'
+    return '\t'.join([str(cell) if cell is not None else '' for cell in row]) + '\n'
+
+
+class CompressedTextWriter:
+    """边写边压缩的文本输出（gzip / zstd）
+    
+    写入的文本攒成块后交给后台线程压缩写盘，压缩（zlib/zstd 释放GIL）与SQLite读取、序列化并行。
+    flush() 结束当前的 gzip 成员或 zstd 帧并等待写盘，文件在该位置是完整可解压的；
+    续写时截断到该位置再追加新的成员/帧，多成员 gzip 和多帧 zstd 都能被标准工具直接解压。
+    """
+    
+    def __init__(self, output_path, compression, resume_bytes=None, newline='\n'):
+        if compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd 压缩需要安装 zstandard")
+            self.zstd = zstandard.ZstdCompressor()
+        self.compression = compression
+        self.newline = newline
+        if resume_bytes is not None:
+            self.file = open(output_path, 'r+b')
+            self.file.seek(resume_bytes)
+            self.file.truncate()
+        else:
+            self.file = open(output_path, 'wb')
+        self.buffer = []
+        self.buffered = 0
+        self.blocks = queue.Queue(maxsize=COMPRESS_QUEUE_BLOCKS)
+        self.error = None
+        self.compressor = self._new_compressor()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def _new_compressor(self):
+        if self.compression == 'gzip':
+            return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31：带 gzip 头尾
+        return self.zstd.compressobj()
+    
+    def _run(self):
+        """压缩线程：出错后继续取走队列中的块，避免调用方阻塞，错误在下一次调用时抛出"""
+        while True:
+            item = self.blocks.get()
+            if item is None:
+                return
+            try:
+                if self.error is None:
+                    if isinstance(item, threading.Event):
+                        self.file.write(self.compressor.flush())
+                        self.file.flush()
+                        self.compressor = self._new_compressor()
+                    else:
+                        self.file.write(self.compressor.compress(item))
+            except Exception as e:
+                self.error = e
+            finally:
+                if isinstance(item, threading.Event):
+                    item.set()
+    
+    def _check(self):
+        if self.error is not None:
+            raise ValueError(f"压缩写入失败: {self.error}")
+    
+    def _submit(self):
+        if self.buffer:
+            self.blocks.put(''.join(self.buffer).encode('utf-8'))
+            self.buffer = []
+            self.buffered = 0
+        self._check()
+    
+    def write(self, text):
+        if self.newline != '\n':
+            text = text.replace('\n', self.newline)
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= COMPRESS_BLOCK_BYTES:
+            self._submit()
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def flush(self):
+        """结束当前压缩帧并等待全部数据写盘"""
+        self._submit()
+        done = threading.Event()
+        self.blocks.put(done)
+        done.wait()
+        self._check()
+    
+    def tell(self):
+        """已写盘的压缩字节数（在 flush() 之后调用）"""
+        return self.file.tell()
+    
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.blocks.put(None)
+            self.thread.join()
+            self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_text_output(output_path, export_format, compression=None, resume_bytes=None):
+    """打开 CSV/TXT 输出文件，resume_bytes 不为None时截断到该位置续写"""
+    if compression:
+        return CompressedTextWriter(output_path, compression, resume_bytes,
+                                    newline='\n' if export_format == 'csv' else os.linesep)
+    f = open(output_path, 'w' if resume_bytes is None else 'r+', encoding='utf-8',
+             newline='' if export_format == 'csv' else None)
+    if resume_bytes is not None:
+        f.seek(resume_bytes)
+        f.truncate()
+    return f
+
+
+def text_header(columns, export_format):
+    return (',' if export_format == 'csv' else '\t').join(columns) + '\n'
+
+
+def split_output_path(output_path):
+    """拆成 (不含扩展名的路径, 扩展名)，压缩文件的扩展名包含两段，如 .csv.gz"""
+    ext = os.path.splitext(output_path)[1]
+    if ext.lower() in TEXT_COMPRESSIONS.values():
+        ext = os.path.splitext(output_path[:-len(ext)])[1] + ext
+    return output_path[:len(output_path) - len(ext)], ext
+
+
+def append_file(out, part_path):
+    """把文件内容追加到已打开的 out 末尾，优先在内核中复制（copy_file_range / sendfile），都不可用时退回普通读写"""
+    out.flush()
+    with open(part_path, 'rb') as src:
+        remaining = os.fstat(src.fileno()).st_size
+        offset = 0
+        for copy in [getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)]:
+            if copy is None:
+                continue
+            try:
+                while remaining > 0:
+                    if copy is os.sendfile:
+                        copied = os.sendfile(out.fileno(), src.fileno(), offset, remaining)
+                    else:
+                        copied = os.copy_file_range(src.fileno(), out.fileno(), remaining, offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                    remaining -= copied
+                return
+            except OSError:
+                # 跨文件系统或平台不支持，换下一种方式从已复制的位置继续
+                continue
+        src.seek(offset)
+        shutil.copyfileobj(src, out, 1024 * 1024)
+
+
+def file_checksum(file_path):
+    """文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_rowid_range(conn, table_name, columns, rowid_range, output_path, export_format,
+                      batch_size, compression=None, schema=None, header=True, checksum=True):
+    """把 rowid 在 (lo, hi] 内的行写成一个完整文件，返回分片信息
+    
+    只依赖传入的连接，可在主进程中使用，也可由 write_shard_worker 在子进程中使用。
+    header=False 时 CSV/TXT 不写表头，用于拼接成单个文件的后续分块。
+    checksum=False 时不计算 SHA-256（拼接后即删除的临时分块不需要）。
+    """
+    lo, hi = rowid_range
+    cursor = conn.execute(f"SELECT * FROM {table_name} WHERE rowid > ? AND rowid <= ? ORDER BY rowid", (lo, hi))
+    batches = iter(lambda: cursor.fetchmany(batch_size), [])
+    rows_written = 0
+    if export_format in ['csv', 'txt']:
+        with open_text_output(output_path, export_format, compression) as f:
+            if header:
+                f.write(text_header(columns, export_format))
+            for rows in batches:
+                f.writelines(format_text_row(row, export_format) for row in rows)
+                rows_written += len(rows)
+    elif export_format == 'xlsx':
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet('Result')
+        worksheet.append(columns)
+        for rows in batches:
+            for row in rows:
+                worksheet.append(row)
+            rows_written += len(rows)
+        workbook.save(output_path)
+    else:
+        writer = ColumnarWriter(output_path, export_format, schema, compression)
+        try:
+            for rows in batches:
+                writer.write(rows)
+                rows_written += len(rows)
+        finally:
+            writer.close()
+    cursor.close()
+    shard = {
+        'file': os.path.basename(output_path),
+        'rows': rows_written,
+        'bytes': os.path.getsize(output_path)
+    }
+    if checksum:
+        shard['sha256'] = file_checksum(output_path)
+    return shard
+
+
+class ColumnarWriter:
+    """Parquet / Arrow IPC 写入器：每次写入的一批行成为一个行组（记录批），Parquet 对字符串列使用字典编码"""
+    
+    def __init__(self, output_path, export_format, schema, compression):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError(f"导出 {export_format} 格式需要安装 pyarrow")
+        self.pa = pa
+        self.schema = schema
+        codec = None if compression == 'none' else compression
+        self.sink = None
+        if export_format == 'parquet':
+            self.writer = pq.ParquetWriter(output_path, schema, compression=codec or 'none', use_dictionary=True)
+        else:
+            self.sink = pa.OSFile(output_path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+    
+    def write(self, rows):
+        arrays = [self.pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+    
+    def close(self):
+        self.writer.close()
+        if self.sink:
+            self.sink.close()
+
+
+def write_shard_worker(db_path, table_name, columns, rowid_range, output_path, export_format,
+                       batch_size, compression=None, schema=None, header=True, checksum=True):
+    """子进程入口：以只读连接打开工作库并写出一个分片"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return write_rowid_range(conn, table_name, columns, rowid_range, output_path, export_format,
+                                 batch_size, compression, schema, header, checksum)
+    finally:
+        conn.close()
+
+
+class ArrowReader:
+    """Parquet / Arrow IPC(Feather) 的分块读取器
+    
+    Parquet 按行组流式解码，Arrow IPC 文件内存映射后按记录批读取，都不经过文本解析。
+    所有列转为字符串，与 CSV 按字符串读入的语义一致；数据块按请求的行数切分和拼接后转为 DataFrame。
+    """
+    
+    def __init__(self, file_path, batch_size, columns=None, nrows=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError(f"读取 {os.path.basename(file_path)} 需要安装 pyarrow")
+        self.pa = pa
+        self.batch_size = batch_size
+        self.remaining = nrows
+        self.pending = []  # 尚未交出的记录批
+        self.pending_rows = 0
+        if os.path.splitext(file_path)[1].lower() == '.parquet':
+            self.source = pq.ParquetFile(file_path)
+            self.batches = self.source.iter_batches(batch_size=PARQUET_BATCH_ROWS, columns=columns)
+        else:
+            self.source = pa.memory_map(file_path)
+            try:
+                ipc_reader = pa.ipc.open_file(self.source)
+                batches = (ipc_reader.get_batch(i) for i in range(ipc_reader.num_record_batches))
+            except pa.ArrowInvalid:
+                # Arrow IPC 流格式（没有文件尾）
+                self.source.seek(0)
+                batches = pa.ipc.open_stream(self.source)
+            self.batches = (batch.select(columns) if columns else batch for batch in batches)
+    
+    def _to_strings(self, batch):
+        pa = self.pa
+        arrays = [
+            column if pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+            else column.cast(pa.string())
+            for column in batch.columns
+        ]
+        return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+    
+    def get_chunk(self, size):
+        """取下一个最多 size 行的数据块，读完时抛出 StopIteration"""
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        while self.pending_rows < size:
+            batch = next(self.batches, None)
+            if batch is None:
+                break
+            self.pending.append(batch)
+            self.pending_rows += batch.num_rows
+        if self.pending_rows == 0 or size <= 0:
+            raise StopIteration
+        
+        table = self.pa.Table.from_batches(self.pending)
+        chunk, rest = table.slice(0, size), table.slice(size)
+        self.pending = rest.to_batches()
+        self.pending_rows = rest.num_rows
+        if self.remaining is not None:
+            self.remaining -= chunk.num_rows
+        batches = [self._to_strings(batch) for batch in chunk.to_batches()]
+        return self.pa.Table.from_batches(batches).to_pandas()
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        return self.get_chunk(self.batch_size)
+    
+    def close(self):
+        self.source.close()
+
+
+class MemoryGovernor:
+    """全局内存调控
+    
+    按阶段记录进程RSS（起止值与峰值），在内存预算受到威胁时切换到更省内存的策略：
+    限制SQLite缓存、避免进程内数据库、临时数据落盘、缩小批量、Excel流式写入。
+    每个决策都写入日志和运行报告。
+    """
+    
+    def __init__(self, memory_budget):
+        self.memory_budget = memory_budget
+        self.process = psutil.Process()
+        self.conn = None
+        self.stage = None
+        self.stage_started = None
+        self.stages = {}  # 阶段名 -> RSS统计（MB）与耗时
+        self.decisions = []
+        self.spilled = False
+    
+    def attach(self, conn):
+        """关联工作库连接，内存紧张时调整其临时存储和缓存"""
+        self.conn = conn
+        self.spilled = False
+    
+    def rss(self):
+        return self.process.memory_info().rss
+    
+    def headroom(self):
+        """距离内存预算还剩的字节数"""
+        return self.memory_budget - self.rss()
+    
+    def decide(self, action, reason):
+        """记录一次策略切换"""
+        self.decisions.append({'stage': self.stage, 'action': action, 'reason': reason,
+                               'rss_mb': round(self.rss() / 1024 / 1024, 1)})
+        logger.info(f"内存调控[{self.stage or '初始化'}]: {action}（{reason}）")
+    
+    def begin_stage(self, name):
+        """开始新阶段，自动结束上一阶段"""
+        self.end_stage()
+        rss_mb = self.rss() / 1024 / 1024
+        self.stage = name
+        self.stage_started = time.time()
+        self.stages[name] = {'start_mb': round(rss_mb, 1), 'peak_mb': round(rss_mb, 1)}
+    
+    def end_stage(self):
+        if not self.stage:
+            return
+        stats = self.stages[self.stage]
+        self.check()
+        rss_mb = self.rss() / 1024 / 1024
+        stats['end_mb'] = round(rss_mb, 1)
+        stats['growth_mb'] = round(stats['peak_mb'] - stats['start_mb'], 1)
+        stats['seconds'] = round(time.time() - self.stage_started, 2)
+        logger.info(f"阶段 {self.stage} 内存: {stats['start_mb']} MB → {stats['end_mb']} MB，峰值 {stats['peak_mb']} MB")
+        self.stage = None
+    
+    def check(self):
+        """采样RSS并更新当前阶段峰值，超过警戒线时释放SQLite内存，返回RSS（字节）"""
+        rss = self.rss()
+        if self.stage:
+            stats = self.stages[self.stage]
+            stats['peak_mb'] = max(stats['peak_mb'], round(rss / 1024 / 1024, 1))
+        if rss > self.memory_budget * RSS_HIGH_WATER_RATIO:
+            self.spill(f"RSS {rss / 1024 / 1024:.0f} MB 超过预算的 {RSS_HIGH_WATER_RATIO:.0%}")
+        return rss
+    
+    def under_pressure(self, rss):
+        return rss > self.memory_budget * RSS_HIGH_WATER_RATIO
+    
+    def spill(self, reason):
+        """临时数据改为落盘，并把SQLite页缓存缩到最小"""
+        if self.spilled or not self.conn:
+            return
+        self.spilled = True
+        self.conn.execute("PRAGMA temp_store = FILE")
+        self.conn.execute(f"PRAGMA cache_size = -{PRESSURE_CACHE_KB}")
+        self.conn.execute("PRAGMA shrink_memory")
+        self.decide(f"SQLite临时数据落盘，页缓存降为 {PRESSURE_CACHE_KB} KB", reason)
+    
+    def limit_tuning(self, settings):
+        """把SQLite页缓存和内存映射限制在预算的一定比例内"""
+        limit_kb = int(self.memory_budget * SQLITE_MEMORY_RATIO / 1024)
+        if -settings['cache_size'] > limit_kb:
+            self.decide(f"页缓存由 {-settings['cache_size']} KB 限制为 {limit_kb} KB", "超出内存预算份额")
+            settings['cache_size'] = -limit_kb
+        if settings['mmap_size'] > limit_kb * 1024:
+            self.decide(f"内存映射由 {settings['mmap_size'] // 1024 // 1024} MB 限制为 {limit_kb // 1024} MB",
+                        "映射页计入RSS")
+            settings['mmap_size'] = limit_kb * 1024
+        return settings
+    
+    def allow_in_process(self, nbytes, action):
+        """判断把 nbytes 的数据放在进程内存中是否会超出预算，超出时记录替代做法 action"""
+        if nbytes <= self.headroom() * (1 - RSS_HIGH_WATER_RATIO):
+            return True
+        self.decide(action, f"预计需要 {nbytes / 1024 / 1024:.0f} MB，剩余预算 {self.headroom() / 1024 / 1024:.0f} MB")
+        return False
+    
+    def plan_sort(self):
+        """排序/去重前：临时数据在内存中且工作库大小超出剩余预算时提前落盘"""
+        if self.spilled or not self.conn:
+            return
+        temp_store = self.conn.execute("PRAGMA temp_store").fetchone()[0]
+        if temp_store != 2:  # 2 = MEMORY
+            return
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        if not self.allow_in_process(page_count * page_size, "排序前临时数据提前落盘"):
+            self.spill("工作库大小超出剩余内存预算")
+    
+    def use_streaming_xlsx(self, cells):
+        """常规模式的Excel工作簿会在内存中保留全部单元格，超出预算时改为流式写入"""
+        return not self.allow_in_process(cells * XLSX_CELL_BYTES, "Excel改为流式写入")
+    
+    def report(self):
+        """运行报告中的内存部分（引用内部记录，随运行更新）"""
+        return {'budget_mb': self.memory_budget // 1024 // 1024, 'stages': self.stages, 'decisions': self.decisions}
+
+
+class BatchSizer:
+    """按内存预算自适应调整批量大小
+    
+    根据已读取数据块测得的每行字节数计算下一批的行数；进程RSS接近预算上限时批量减半，
+    且之后不再放大。
+    """
+    
+    def __init__(self, governor, name, initial_size=PROBE_BATCH_SIZE):
+        self.governor = governor
+        self.name = name
+        self.batch_size = initial_size
+        self.size_limit = MAX_BATCH_SIZE
+        self.row_bytes = 0
+    
+    def observe(self, rows, nbytes):
+        """记录一批数据的行数和内存占用，返回下一批的行数"""
+        if rows > 0:
+            # 取测得的最大行宽，避免后续出现宽行时数据块突然变大
+            self.row_bytes = max(self.row_bytes, nbytes / rows)
+        
+        rss = self.governor.check()
+        if self.governor.under_pressure(rss) and self.batch_size > MIN_BATCH_SIZE:
+            self.size_limit = max(MIN_BATCH_SIZE, self.batch_size // 2)
+            self.governor.decide(f"{self.name}批量上限降为 {self.size_limit} 行",
+                                 f"RSS {rss / 1024 / 1024:.0f} MB 接近预算")
+        
+        size = self.batch_size
+        if self.row_bytes:
+            size = int(self.governor.memory_budget * BATCH_MEMORY_RATIO / self.row_bytes)
+        size = max(MIN_BATCH_SIZE, min(self.size_limit, size))
+        # 变化不足10%时保持原批量，避免行宽小幅波动导致频繁调整
+        if abs(size - self.batch_size) * 10 > self.batch_size or self.batch_size > self.size_limit:
+            logger.info(f"{self.name}: 每行约 {self.row_bytes:.0f} 字节，批量调整为 {size} 行")
+            self.batch_size = size
+        return self.batch_size
+    
+    def observe_rows(self, rows):
+        """按采样行估算查询结果的内存占用并记录"""
+        sample = rows[:ROW_SAMPLE_SIZE]
+        if not sample:
+            return self.batch_size
+        sample_bytes = sum(sys.getsizeof(row) + sum(sys.getsizeof(cell) for cell in row) for row in sample)
+        return self.observe(len(rows), sample_bytes * len(rows) / len(sample))
+
 
 class DataProcessor:
-    def __init__(self):
+    def __init__(self, tuning_profile='auto', scratch_dir=None, storage_mode='auto', memory_budget_mb=MEMORY_BUDGET_MB,
+                 format_overrides=None, normalization=None):
+        load_dependencies()
+        for rule in normalization or []:
+            if rule not in NORMALIZATION_RULES:
+                raise ValueError(f"不支持的比较规则: {rule}，支持的规则: {', '.join(NORMALIZATION_RULES)}")
+        # 比较规则，为空时按原始值比较
+        self.normalization = [rule for rule in NORMALIZATION_RULES if rule in (normalization or [])]
+        self.tuning_profile = tuning_profile
+        self.scratch_dir = scratch_dir or os.environ.get(SCRATCH_DIR_ENV) or tempfile.gettempdir()
+        self.storage_mode = storage_mode  # auto / disk / memory
+        self.memory_budget = memory_budget_mb * 1024 * 1024  # 字节
+        self.governor = MemoryGovernor(self.memory_budget)
+        self.run_report = {'memory': self.governor.report()}  # 运行报告：记录本次任务实际采用的配置
         self.temp_db = None
         self.conn = None
         self.cursor = None
         self.executor = ThreadPoolExecutor(max_workers=4)
+        # 文件路径 -> 格式覆盖（encoding / delimiter / quotechar / header），优先于探测结果和配置文件
+        self.format_overrides = {os.path.abspath(path): options for path, options in (format_overrides or {}).items()}
+        self.text_formats = {}  # 文件指纹 -> 探测到的文本格式
         self.is_processing = False
+        self.null_tables = {}  # 表名 -> 导入时是否出现过NULL值
+        self.text_columns = set()  # 导入中出现有损值而改为 TEXT 的列，之后建的表也按 TEXT 建列
+        self.job_id = None  # 可恢复任务ID，为None时工作库用完即删
+        self.delta_id = None  # 增量库ID，不为None时工作库即增量库，长期保留
+        self.delta_tracking = False  # 是否记录增量更新中被改动的行（结果表将重建时不需要）
+        self.cancel_requested = False
+        self.job_completed = False
+        self.job_discarded = False
+    
+    def input_size(self, file_paths):
+        """输入文件的总大小（字节），压缩文件按解压后的估算大小计"""
+        total = 0
+        for file_path in file_paths:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                continue
+            if split_input_extension(file_path)[1]:
+                size *= COMPRESSED_SIZE_FACTOR
+            total += size
+        return total
+    
+    def estimate_work_db_size(self, file_paths):
+        """按输入文件大小估算工作库所需空间（字节）"""
+        return self.input_size(file_paths) * WORK_DB_SIZE_FACTOR
+    
+    def make_job_id(self, files_a, files_b, operation, export_format, compression=None, output_path=None):
+        """根据输入文件（路径、大小、修改时间）和运算、导出参数生成任务ID，输入和参数不变则ID不变"""
+        job = {
+            'files_a': [file_fingerprint(f) for f in files_a],
+            'files_b': [file_fingerprint(f) for f in files_b],
+            'operation': operation,
+            'export_format': export_format,
+            'compression': compression,
+            'output_path': os.path.abspath(output_path) if output_path else None
+        }
+        if self.normalization:
+            job['normalization'] = self.normalization
+        return hashlib.sha1(json.dumps(job, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    
+    def make_delta_id(self, files_a, files_b):
+        """根据两个数据集所在的目录生成增量库ID，目录内的分片增删改后仍使用同一个增量库"""
+        dirs = {
+            'dirs_a': sorted({os.path.dirname(os.path.abspath(f)) for f in files_a}),
+            'dirs_b': sorted({os.path.dirname(os.path.abspath(f)) for f in files_b})
+        }
+        return hashlib.sha1(json.dumps(dirs, sort_keys=True).encode('utf-8')).hexdigest()[:16]
     
-    def init_db(self):
-        """初始化临时数据库"""
+    def choose_work_db_path(self, estimated_bytes, job_id=None, delta_id=None):
+        """选择临时数据库位置，并检查剩余空间是否足够"""
+        if self.storage_mode not in ['auto', 'disk', 'memory']:
+            raise ValueError(f"不支持的存储模式: {self.storage_mode}，支持的模式: auto, disk, memory")
+        
+        available = psutil.virtual_memory().available
+        # 可恢复任务和增量库必须落盘
+        use_memory = not job_id and not delta_id and (self.storage_mode == 'memory' or (
+            self.storage_mode == 'auto' and estimated_bytes and estimated_bytes <= available * MEMORY_MODE_RATIO
+        ))
+        if use_memory:
+            if self.storage_mode == 'memory' and estimated_bytes > available:
+                raise ValueError(f"可用内存不足: 预计需要 {estimated_bytes / 1024 / 1024:.0f} MB，可用 {available / 1024 / 1024:.0f} MB")
+            # 优先使用 /dev/shm（保留按路径访问的能力），其容量不足或不可用时使用 :memory:
+            # :memory: 计入进程RSS，自动模式下超出内存预算时改用磁盘
+            if (os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK)
+                    and shutil.disk_usage(SHM_DIR).free > estimated_bytes):
+                fd, temp_db = tempfile.mkstemp(suffix='.db', dir=SHM_DIR)
+                os.close(fd)
+                mode = 'shm'
+            elif self.storage_mode == 'memory' or self.governor.allow_in_process(estimated_bytes, "工作库改用磁盘"):
+                temp_db = ':memory:'
+                mode = 'memory'
+            else:
+                use_memory = False
+            free = available
+        if not use_memory:
+            os.makedirs(self.scratch_dir, exist_ok=True)
+            free = shutil.disk_usage(self.scratch_dir).free
+            if estimated_bytes > free:
+                raise ValueError(
+                    f"临时目录空间不足: {self.scratch_dir} 预计需要 {estimated_bytes / 1024 / 1024:.0f} MB，"
+                    f"剩余 {free / 1024 / 1024:.0f} MB"
+                )
+            if delta_id:
+                delta_dir = os.path.join(self.scratch_dir, DELTA_DIR_NAME)
+                os.makedirs(delta_dir, exist_ok=True)
+                temp_db = os.path.join(delta_dir, f"{delta_id}.db")
+            elif job_id:
+                jobs_dir = os.path.join(self.scratch_dir, JOBS_DIR_NAME)
+                os.makedirs(jobs_dir, exist_ok=True)
+                temp_db = os.path.join(jobs_dir, f"{job_id}.db")
+            else:
+                fd, temp_db = tempfile.mkstemp(suffix='.db', dir=self.scratch_dir)
+                os.close(fd)
+            mode = 'disk'
+        
+        self.run_report['storage'] = {
+            'mode': mode,
+            'path': temp_db,
+            'estimated_bytes': estimated_bytes,
+            'free_bytes': free
+        }
+        logger.info(f"临时数据库存储模式: {mode}，预计大小 {estimated_bytes / 1024 / 1024:.2f} MB，可用 {free / 1024 / 1024:.0f} MB")
+        return temp_db
+    
+    def init_db(self, input_files=None, job_id=None, delta_id=None):
+        """初始化临时数据库
+        
+        Args:
+            input_files: 本次任务的全部输入文件，用于估算工作库大小；不传时使用磁盘模式且不做空间检查
+            job_id: 可恢复任务ID（见 make_job_id）。工作库保存在 scratch_dir 下，任务未完成时
+                不会被删除（discard_job 放弃的除外），同一任务再次运行时从最后的检查点继续；
+                长期未恢复的工作库由 remove_stale_jobs 清理
+            delta_id: 增量库ID（见 make_delta_id）。工作库即增量库，保存在 scratch_dir 下且不会被删除，
+                由 delta_refresh 增量更新
+        """
         try:
             logger.info("开始初始化临时数据库")
             # 创建临时数据库文件
-            temp_db = tempfile.mktemp(suffix='.db')
+            self.job_id = job_id
+            self.delta_id = delta_id
+            self.job_completed = False
+            self.job_discarded = False
+            estimated_bytes = self.estimate_work_db_size(input_files or [])
+            if delta_id and os.path.exists(os.path.join(self.scratch_dir, DELTA_DIR_NAME, f"{delta_id}.db")):
+                # 已有增量库只写入变化的分片，无法预先估算，不做空间检查
+                estimated_bytes = 0
+            temp_db = self.choose_work_db_path(estimated_bytes, job_id, delta_id)
+            resumed = bool(job_id) and os.path.exists(temp_db)
             self.temp_db = temp_db
-            logger.info(f"创建临时数据库文件: {temp_db}")
+            logger.info(f"{'打开已有' if resumed else '创建'}临时数据库文件: {temp_db}")
             
             # 连接数据库
             logger.info("连接数据库")
             self.conn = sqlite3.connect(temp_db)
             self.cursor = self.conn.cursor()
+            self.governor.attach(self.conn)
+            # 长时间运行的SQL（去重、建索引、集合运算）定期检查取消请求
+            self.cancel_requested = False
+            self.conn.set_progress_handler(self.check_cancel, CANCEL_CHECK_INTERVAL)
             logger.info("数据库连接成功")
             
             # SQLite优化
             logger.info("开始优化SQLite配置")
-            self.cursor.execute('PRAGMA journal_mode = WAL')  # 写前日志模式，提高性能
-            self.cursor.execute('PRAGMA synchronous = NORMAL')  # 同步级别，平衡性能和安全性
-            self.cursor.execute('PRAGMA cache_size = -64000')  # 64MB缓存，提高处理速度
-            self.cursor.execute('PRAGMA temp_store = MEMORY')  # 临时表使用内存
+            self.apply_tuning(self.resolve_tuning(self.tuning_profile))
             self.cursor.execute('PRAGMA foreign_keys = OFF')  # 关闭外键约束，提高性能
             self.cursor.execute('PRAGMA automatic_index = ON')  # 自动创建索引
-            self.cursor.execute('PRAGMA mmap_size = 30000000000')  # 启用内存映射，提高大文件处理速度
             self.cursor.execute('PRAGMA busy_timeout = 30000')  # 30秒超时，避免锁冲突
             logger.info("SQLite配置优化完成")
             
+            # 任务清单：记录各阶段检查点，与数据在同一事务中提交
+            if job_id:
+                self.cursor.execute("CREATE TABLE IF NOT EXISTS job_manifest (key TEXT PRIMARY KEY, value TEXT)")
+                self.run_report['job'] = {'job_id': job_id, 'resumed': resumed}
+                self.text_columns = set(self.get_checkpoint('text_columns') or [])
+                logger.info(f"可恢复任务 {job_id}，{'从检查点恢复' if resumed else '新任务'}")
+            
             # 开始事务
             self.conn.execute('BEGIN TRANSACTION')
             logger.info("事务开始")
@@ -66,10 +1200,86 @@ class DataProcessor:
             logger.error(error_msg)
             raise ValueError(error_msg)
     
+    def resolve_tuning(self, profile):
+        """解析调优档案，auto 根据物理内存自动选择并按可用内存调整缓存"""
+        if profile != 'auto':
+            if profile not in SQLITE_PROFILES:
+                raise ValueError(f"不支持的调优档案: {profile}，支持的档案: auto, {', '.join(SQLITE_PROFILES)}")
+            return profile, dict(SQLITE_PROFILES[profile])
+        
+        memory = psutil.virtual_memory()
+        total_gb = memory.total / 1024 / 1024 / 1024
+        if total_gb < 8:
+            profile = 'low_memory'
+        elif total_gb < 32:
+            profile = 'balanced'
+        else:
+            profile = 'big_server'
+        settings = dict(SQLITE_PROFILES[profile])
+        # 缓存取可用内存的1/8，不低于档案默认值，不超过档案上限
+        cache_kb = int(memory.available / 1024 / 8)
+        settings['cache_size'] = -max(-settings['cache_size'], min(cache_kb, AUTO_CACHE_LIMITS[profile]))
+        logger.info(f"自动调优: 物理内存 {total_gb:.1f} GB，可用 {memory.available / 1024 / 1024:.0f} MB，选择档案 {profile}")
+        return profile, settings
+    
+    def apply_tuning(self, tuning):
+        """应用调优参数，并将实际生效的值写入运行报告"""
+        profile, settings = tuning
+        settings = self.governor.limit_tuning(settings)
+        if self.job_id or self.delta_id:
+            # 可恢复任务和增量库需要在崩溃后保持一致，不能关闭日志
+            settings.update({'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+        # page_size 必须在建表前设置
+        for pragma in ['page_size', 'journal_mode', 'synchronous', 'locking_mode', 'cache_size', 'mmap_size', 'temp_store']:
+            self.cursor.execute(f"PRAGMA {pragma} = {settings[pragma]}")
+        
+        applied = {}
+        for pragma in settings:
+            self.cursor.execute(f"PRAGMA {pragma}")
+            row = self.cursor.fetchone()
+            applied[pragma] = row[0] if row else None
+        self.run_report['sqlite'] = {'profile': profile, 'settings': applied}
+        logger.info(f"SQLite调优档案 {profile}: {applied}")
+    
+    def check_cancel(self):
+        """SQLite进度处理器：返回非0值时中止当前语句"""
+        return 1 if self.cancel_requested else 0
+    
+    def get_checkpoint(self, key):
+        """读取任务检查点，非可恢复任务或尚无检查点时返回None"""
+        if not self.job_id:
+            return None
+        self.cursor.execute("SELECT value FROM job_manifest WHERE key = ?", (key,))
+        row = self.cursor.fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set_checkpoint(self, key, value):
+        """写入任务检查点（随当前事务一起提交）"""
+        if not self.job_id:
+            return
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO job_manifest (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False))
+        )
+    
+    def resumed_export_path(self, table_name='result'):
+        """返回上次运行中未完成导出的输出路径，用于续写同一文件"""
+        checkpoint = self.get_checkpoint(f"export:{table_name}")
+        return checkpoint['path'] if checkpoint else None
+    
+    def finish_job(self):
+        """标记任务完成，close_db 时删除工作库"""
+        self.job_completed = True
+    
+    def discard_job(self):
+        """放弃可恢复任务（如用户停止处理），close_db 时删除工作库，不再保留检查点"""
+        self.job_discarded = True
+    
     def close_db(self):
         """关闭数据库连接并清理临时文件"""
         try:
             logger.info("开始关闭数据库连接并清理资源")
+            self.governor.end_stage()
             
             # 标记为停止处理
             try:
@@ -82,6 +1292,8 @@ class DataProcessor:
             if hasattr(self, 'conn') and self.conn:
                 try:
                     logger.info("开始关闭数据库连接")
+                    # 移除进度处理器，确保取消后仍能提交检查点
+                    self.conn.set_progress_handler(None, 0)
                     # 尝试提交任何未提交的事务
                     try:
                         self.conn.commit()
@@ -108,6 +1320,14 @@ class DataProcessor:
                     except Exception as e:
                         logger.warning(f"清理数据库连接对象失败: {e}")
             
+            # 未完成的可恢复任务保留工作库，增量库始终保留
+            if self.job_id and not (self.job_completed or self.job_discarded):
+                logger.info(f"任务 {self.job_id} 未完成，保留工作库以便恢复: {self.temp_db}")
+                self.temp_db = None
+            elif self.delta_id:
+                logger.info(f"保留增量库: {self.temp_db}")
+                self.temp_db = None
+            
             # 清理临时文件
             if hasattr(self, 'temp_db') and self.temp_db:
                 try:
@@ -143,6 +1363,13 @@ class DataProcessor:
                                 logger.error(f"重命名临时文件失败: {e}")
                         else:
                             logger.info(f"临时文件 {self.temp_db} 删除成功")
+                        # 清理WAL模式留下的附属文件
+                        for suffix in ['-wal', '-shm', '-journal']:
+                            if os.path.exists(self.temp_db + suffix):
+                                try:
+                                    os.unlink(self.temp_db + suffix)
+                                except Exception as e:
+                                    logger.warning(f"删除临时文件 {self.temp_db + suffix} 失败: {e}")
                     else:
                         logger.info(f"临时文件 {self.temp_db} 不存在，无需删除")
                 except Exception as e:
@@ -189,7 +1416,7 @@ class DataProcessor:
             # 清理其他属性
             try:
                 # 清理可能的大对象
-                for attr in ['files_a', 'files_b', 'operation', 'output_path', 'export_format']:
+                for attr in ['files_a', 'files_b', 'operation', 'output_path', 'export_format', 'region_counts']:
                     if hasattr(self, attr):
                         delattr(self, attr)
                 logger.info("清理其他属性完成")
@@ -224,21 +1451,354 @@ class DataProcessor:
             except:
                 pass
     
-    def import_files(self, file_paths, table_name, progress_callback=None):
-        """导入文件到数据库"""
-        import psutil
+    def clean_column_name(self, col, index):
+        """清理列名，使其可直接用作SQLite列名"""
+        clean_col = str(col).strip().replace(' ', '_').replace('-', '_').replace('.', '_')
+        # 确保列名不为空
+        if not clean_col:
+            clean_col = f"col_{index}"
+        return clean_col
+    
+    def open_reader(self, file_path, batch_size, **kwargs):
+        """按扩展名创建分块读取器，文本文件以字符串读入，由列类型统一规范化
+        
+        压缩文件（gz/zst/bz2/xz）边解压边解析，zip 归档按成员并行解压，Parquet/Arrow 不经过文本解析。
+        """
+        data_ext, compression = split_input_extension(file_path)
+        if compression == 'zip':
+            return ArchiveReader(file_path, batch_size, self.executor, self.open_text_reader,
+                                 **self.text_read_options(file_path), **kwargs)
+        if data_ext in COLUMNAR_EXTENSIONS:
+            return ArrowReader(file_path, batch_size, **kwargs)
+        if compression == 'zstd':
+            try:
+                import zstandard  # noqa: F401  pandas 读取 .zst 依赖此包
+            except ImportError:
+                raise ValueError(f"读取 {os.path.basename(file_path)} 需要安装 zstandard")
+        if data_ext in TEXT_EXTENSIONS:
+            return self.open_text_reader(file_path, data_ext, batch_size, compression=compression,
+                                         **self.text_read_options(file_path), **kwargs)
+        elif data_ext in ['.xlsx', '.xls']:
+            return pd.read_excel(file_path, chunksize=batch_size, dtype=str, **kwargs)
+        raise ValueError(f"不支持的文件格式: {input_extension(file_path)}")
+    
+    def open_text_reader(self, source, data_ext, batch_size, **kwargs):
+        """CSV/TXT 分块读取器，source 可以是路径或已打开的二进制流；未探测格式时按扩展名取默认分隔符"""
+        kwargs.setdefault('sep', '\t' if data_ext == '.txt' else ',')
+        return pd.read_csv(source, chunksize=batch_size, low_memory=False, encoding_errors='replace', dtype=str, **kwargs)
+    
+    def load_format_overrides(self, file_path):
+        """读取文件所在目录的格式覆盖配置（setops_formats.json），按文件名的配置优先于 "*" 的配置"""
+        format_file = os.path.join(os.path.dirname(os.path.abspath(file_path)), FORMAT_FILE_NAME)
+        if not os.path.exists(format_file):
+            return {}
+        try:
+            with open(format_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取格式覆盖配置失败 {format_file}: {e}")
+            return {}
+        overrides = {}
+        for key in ['*', os.path.basename(file_path)]:
+            for option, value in (config.get(key) or {}).items():
+                if option not in FORMAT_OPTIONS:
+                    logger.warning(f"忽略无效的格式覆盖 {key}.{option}")
+                    continue
+                overrides[option] = value
+        return overrides
+    
+    def detect_text_format(self, file_path):
+        """探测 CSV/TXT 文件的编码、分隔符、引号和表头，按文件指纹缓存，并应用覆盖配置
+        
+        覆盖的优先级：format_overrides（按路径）> setops_formats.json > 探测结果。
+        """
+        key = json.dumps(file_fingerprint(file_path))
+        if key not in self.text_formats:
+            data_ext, compression = split_input_extension(file_path)
+            if compression == 'zip':
+                members = archive_members(file_path)
+                data_ext = os.path.splitext(members[0])[1].lower() if members else '.csv'
+            try:
+                sample = read_text_sample(file_path)
+                # 读到的比上限少，说明样本已是整个文件（或整个首个成员）
+                detected = sniff_text_format(sample, data_ext, complete=len(sample) < SNIFF_BYTES)
+            except Exception as e:
+                logger.warning(f"探测文件格式失败 {os.path.basename(file_path)}: {e}")
+                detected = {'encoding': 'utf-8', 'delimiter': '\t' if data_ext == '.txt' else ',',
+                            'quotechar': '"', 'header': True, 'columns': 0}
+            detected.update(self.load_format_overrides(file_path))
+            detected.update(self.format_overrides.get(os.path.abspath(file_path), {}))
+            logger.info(f"文件格式 {os.path.basename(file_path)}: 编码 {detected['encoding']}，"
+                        f"分隔符 {detected['delimiter']!r}，{'有' if detected['header'] else '无'}表头")
+            self.text_formats[key] = detected
+            self.run_report.setdefault('formats', {})[os.path.abspath(file_path)] = {
+                option: detected[option] for option in FORMAT_OPTIONS
+            }
+        return self.text_formats[key]
+    
+    def text_read_options(self, file_path):
+        """把探测到的格式转换为 read_csv 的参数；无表头时列名为 col_0、col_1 ..."""
+        detected = self.detect_text_format(file_path)
+        options = {'encoding': detected['encoding'], 'sep': detected['delimiter'], 'quotechar': detected['quotechar']}
+        if not detected['header']:
+            options['header'] = None
+            if detected['columns']:
+                options['names'] = [f"col_{index}" for index in range(detected['columns'])]
+        return options
+    
+    def iter_chunks(self, reader, sizer):
+        """按 sizer 当前的批量大小逐块读取；不支持按需取块的读取器按其固定块大小读取"""
+        try:
+            if not hasattr(reader, 'get_chunk'):
+                yield from reader
+                return
+            while True:
+                try:
+                    chunk = reader.get_chunk(sizer.batch_size)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            # 提前结束（停止处理、出错）时也要关闭，释放文件句柄和归档的解压线程
+            if hasattr(reader, 'close'):
+                reader.close()
+    
+    def iter_rows(self, chunk, positions=None, keys=None):
+        """按列取出数据块并逐行组装元组，避免生成整块的二维列表，缺失值转为None
         
+        positions 给出要取的列位置（按插入语句的列顺序），默认取全部列；keys 为规范化键，追加在每行末尾。
+        """
+        if positions is None:
+            positions = range(chunk.shape[1])
+        columns = [chunk.iloc[:, i].to_numpy(dtype=object, na_value=None) for i in positions]
+        if keys is not None:
+            columns.append(keys)
+        return zip(*columns)
+    
+    def table_columns(self, table_name):
+        """表的数据列（不含规范化键列）"""
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        return [col[1] for col in self.cursor.fetchall() if col[1] != NORMALIZED_KEY_COLUMN]
+    
+    def clean_header(self, columns):
+        """清理一个表头的全部列名：pandas 为空列名生成的 Unnamed: N 返回None（不导入），清理后重名的列追加位置序号"""
+        names = []
+        for index, col in enumerate(columns):
+            if str(col).startswith('Unnamed: '):
+                names.append(None)
+                continue
+            name = self.clean_column_name(col, index)
+            if name in names:
+                name = f"{name}_{index}"
+            names.append(name)
+        return names
+    
+    def read_headers(self, file_path):
+        """只读取文件表头（zip 归档每个成员一个），读取失败时返回空列表，由导入时报告错误"""
+        try:
+            reader = self.open_reader(file_path, 1, nrows=1)
+            try:
+                return [self.clean_header(chunk.columns) for chunk in reader]
+            finally:
+                reader.close()
+        except Exception as e:
+            logger.warning(f"读取表头失败 {os.path.basename(file_path)}: {e}")
+            return []
+    
+    def reconcile_columns(self, file_paths, table_name, column_types=None):
+        """导入前读取数据集全部文件的表头，按列名合并为统一的表结构，返回表的列名
+        
+        列按首次出现的顺序排列；表不存在时创建，已存在（恢复或追加导入）时补充新出现的列。
+        文件缺少的列插入NULL，列顺序不同的文件按列名对齐。
+        """
+        headers = {}
+        columns = []
+        for file_path in file_paths:
+            if not isinstance(file_path, str) or not os.path.isfile(file_path) or not is_supported_input(file_path):
+                continue
+            headers[file_path] = self.read_headers(file_path)
+            for header in headers[file_path]:
+                if None in header:
+                    logger.warning(f"{os.path.basename(file_path)}: 忽略 {header.count(None)} 个无列名的列")
+                columns.extend(name for name in header if name and name not in columns)
+        
+        def column_type(col):
+            return 'TEXT' if col in self.text_columns else (column_types or {}).get(col, 'TEXT')
+        
+        table_columns = self.table_columns(table_name)
+        if columns and not table_columns:
+            definitions = [f"{col} {column_type(col)}" for col in columns]
+            if self.normalization:
+                definitions.append(f"{NORMALIZED_KEY_COLUMN} TEXT")
+            logger.info(f"创建表: {table_name}")
+            self.cursor.execute(f"CREATE TABLE {table_name} ({', '.join(definitions)})")
+            table_columns = columns
+        for col in columns:
+            if col not in table_columns:
+                logger.info(f"表 {table_name} 新增列: {col}")
+                self.cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} {column_type(col)}")
+                table_columns.append(col)
+        
+        # 记录与统一表结构不一致的文件
+        mismatched = {}
+        for file_path, file_headers in headers.items():
+            for header in file_headers:
+                names = [name for name in header if name]
+                if names != table_columns:
+                    mismatched[os.path.basename(file_path)] = {
+                        'missing': [col for col in table_columns if col not in names],
+                        'order_differs': [col for col in table_columns if col in names] != names
+                    }
+                    logger.info(f"{os.path.basename(file_path)} 的列与表 {table_name} 不一致，按列名对齐: "
+                                f"{mismatched[os.path.basename(file_path)]}")
+        self.run_report.setdefault('schemas', {})[table_name] = {'columns': table_columns, 'mismatched': mismatched}
+        return table_columns
+    
+    def numeric_columns(self, table_name):
+        """表中按数值亲和存储的列及其类型（INTEGER / REAL）"""
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        return {
+            col[1]: NUMERIC_DECLARED_TYPES[(col[2] or '').upper()]
+            for col in self.cursor.fetchall() if (col[2] or '').upper() in NUMERIC_DECLARED_TYPES
+        }
+    
+    def widen_columns(self, columns):
+        """把列改为 TEXT：之后建的表按 TEXT 建列，已有表中按数值存储这些列的表按新定义重建
+        
+        列类型只按采样推断，之后的数据中出现存入后不能原样读出的值（见 lossy_value）时调用，避免值被改变、
+        不同的原始值被当作相同。已存的值都是无损存入的，转回的文本与原文本相同；rowid、主键和索引保持不变。
+        """
+        self.text_columns.update(columns)
+        self.set_checkpoint('text_columns', sorted(self.text_columns))
+        logger.warning(f"列 {', '.join(columns)} 中有存入数值列后不能原样读出的值，改为 TEXT 存储")
+        self.conn.create_function('setops_text', 1, lambda v: None if v is None else str(v), deterministic=True)
+        
+        self.cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        for table, table_sql in self.cursor.fetchall():
+            if not set(columns) & set(self.numeric_columns(table)):
+                continue
+            logger.info(f"重建表 {table}，列 {', '.join(columns)} 改为 TEXT")
+            self.cursor.execute(f"PRAGMA table_info({table})")
+            table_info = self.cursor.fetchall()
+            names = [col[1] for col in table_info]
+            primary_key = [col[1] for col in sorted(table_info, key=lambda col: col[5]) if col[5]]
+            without_rowid = table_sql.rstrip().upper().endswith('WITHOUT ROWID')
+            
+            definitions = []
+            for _, name, col_type, notnull, default, _ in table_info:
+                definition = f"{name} {'TEXT' if name in columns else col_type}".rstrip()
+                if notnull:
+                    definition += ' NOT NULL'
+                if default is not None:
+                    definition += f' DEFAULT {default}'
+                definitions.append(definition)
+            if primary_key:
+                definitions.append(f"PRIMARY KEY ({', '.join(primary_key)})")
+            self.cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))
+            indexes = [row[0] for row in self.cursor.fetchall()]
+            
+            # 普通表连同 rowid 一起复制（INTEGER PRIMARY KEY 列本身就是 rowid）
+            rowid_alias = len(primary_key) == 1 and dict((col[1], col[2].upper()) for col in table_info)[primary_key[0]] == 'INTEGER'
+            keep_rowid = not without_rowid and not rowid_alias
+            target = (['rowid'] if keep_rowid else []) + names
+            source = (['rowid'] if keep_rowid else []) + [f"setops_text({name})" if name in columns else name for name in names]
+            widened = f"{table}_widened"
+            self.cursor.execute(f"DROP TABLE IF EXISTS {widened}")
+            self.cursor.execute(f"CREATE TABLE {widened} ({', '.join(definitions)}){' WITHOUT ROWID' if without_rowid else ''}")
+            self.cursor.execute(f"INSERT INTO {widened} ({', '.join(target)}) SELECT {', '.join(source)} FROM {table}")
+            self.cursor.execute(f"DROP TABLE {table}")
+            self.cursor.execute(f"ALTER TABLE {widened} RENAME TO {table}")
+            for index_sql in indexes:
+                self.cursor.execute(index_sql)
+        self.run_report['text_columns'] = sorted(self.text_columns)
+    
+    def infer_column_type(self, values):
+        """根据采样值推断列类型：INTEGER / REAL / TEXT"""
+        values = values.dropna()
+        if values.empty:
+            return 'TEXT'
+        # 存入后须能原样读出：INTEGER 列的 "-0"、REAL 列的 "1.50"、"5"（读出为 5.0）都会改变原文本
+        if values.str.fullmatch(INTEGER_PATTERN).all() and lossy_value(values, 'INTEGER') is None:
+            return 'INTEGER'
+        if values.str.fullmatch(REAL_PATTERN).all() and lossy_value(values, 'REAL') is None:
+            return 'REAL'
+        return 'TEXT'
+    
+    def load_schema_overrides(self, file_paths):
+        """读取数据集目录下的列类型覆盖配置（setops_schema.json）"""
+        overrides = {}
+        for directory in dict.fromkeys(os.path.dirname(os.path.abspath(f)) for f in file_paths):
+            schema_file = os.path.join(directory, SCHEMA_FILE_NAME)
+            if not os.path.exists(schema_file):
+                continue
+            try:
+                with open(schema_file, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                for col, col_type in config.items():
+                    col_type = str(col_type).upper()
+                    if col_type not in COLUMN_TYPES:
+                        logger.warning(f"忽略无效的列类型覆盖 {col}: {col_type}")
+                        continue
+                    overrides[self.clean_column_name(col, len(overrides))] = col_type
+                logger.info(f"加载列类型覆盖配置: {schema_file}")
+            except Exception as e:
+                logger.warning(f"读取列类型覆盖配置失败 {schema_file}: {e}")
+        return overrides
+    
+    def infer_schema(self, file_paths):
+        """采样数据集首个可读数据块，推断各列类型，并应用用户覆盖"""
+        schema = {}
+        for file_path in file_paths:
+            try:
+                reader = self.open_reader(file_path, SCHEMA_SAMPLE_ROWS, nrows=SCHEMA_SAMPLE_ROWS)
+                sample = next(iter(reader), None)
+                reader.close()
+            except Exception as e:
+                logger.warning(f"采样文件 {os.path.basename(file_path)} 失败: {e}")
+                continue
+            if sample is None or sample.empty:
+                continue
+            for index, col in enumerate(sample.columns):
+                schema[self.clean_column_name(col, index)] = self.infer_column_type(sample[col])
+            break
+        
+        schema.update({col: col_type for col, col_type in self.load_schema_overrides(file_paths).items() if col in schema})
+        logger.info(f"推断列类型: {schema}")
+        return schema
+    
+    def resolve_column_types(self, files_a, files_b):
+        """推断两个数据集的列类型并取兼容类型，保证两侧比较语义一致"""
+        schema_a = self.infer_schema(files_a)
+        schema_b = self.infer_schema(files_b)
+        
+        # 同名列类型不一致时使用 TEXT：整数文本存入 REAL 列会读出为 5.0，不能原样还原
+        column_types = {}
+        for col in list(schema_a) + [c for c in schema_b if c not in schema_a]:
+            types = {schema[col] for schema in (schema_a, schema_b) if col in schema}
+            column_types[col] = types.pop() if len(types) == 1 else 'TEXT'
+        logger.info(f"统一列类型: {column_types}")
+        return column_types
+    
+    def import_files(self, file_paths, table_name, progress_callback=None, column_types=None):
+        """导入文件到数据库
+        
+        Args:
+            column_types: 列名到 INTEGER/REAL/TEXT 的映射，未给出的列按 TEXT 存储
+        """
         # 记录开始时间和内存使用
         start_time = time.time()
         start_memory = psutil.Process().memory_info().rss / 1024 / 1024  # MB
         logger.info(f"开始导入文件到表 {table_name}")
+        self.governor.begin_stage(f"导入 {table_name}")
         logger.info(f"开始内存使用: {start_memory:.2f} MB")
         logger.info(f"文件数量: {len(file_paths)}")
         
         total_rows = 0
-        batch_size = 50000  # 减少批量大小，降低内存使用
+        rows_since_commit = 0
+        sizer = BatchSizer(self.governor, f"导入 {table_name}")
         file_info = []
         processed_files = 0
+        resumed = False
         
         # 验证文件路径
         if not file_paths:
@@ -256,6 +1816,20 @@ class DataProcessor:
             logger.error(error_msg)
             raise ValueError(error_msg)
         
+        # 预先读取全部表头建立统一的表结构，各数据块按列名插入
+        try:
+            column_order = self.reconcile_columns(file_paths, table_name, column_types)
+            table_columns = set(column_order)
+        except Exception as e:
+            error_msg = f"创建表失败: {str(e)}"
+            logger.error(error_msg)
+            if progress_callback:
+                progress_callback({
+                    'type': 'error',
+                    'error': error_msg
+                })
+            raise ValueError(error_msg)
+        
         for file_path in file_paths:
             # 检查是否需要停止处理
             if hasattr(self, 'is_processing') and not self.is_processing:
@@ -325,20 +1899,43 @@ class DataProcessor:
                     })
                 continue
             
-            file_ext = os.path.splitext(file_path)[1].lower()
+            file_ext = input_extension(file_path)
             file_rows = 0
             chunk_count = 0
             
+            # 检查点：已完成的文件直接跳过，未完成的文件跳过已导入的行
+            checkpoint_key = f"import:{table_name}:{os.path.abspath(file_path)}"
+            checkpoint = self.get_checkpoint(checkpoint_key)
+            resume_rows = 0
+            if checkpoint:
+                resumed = True
+                if checkpoint['done']:
+                    logger.info(f"文件已在上次运行中导入，跳过: {os.path.basename(file_path)}")
+                    total_rows += checkpoint['imported']
+                    file_info.append({
+                        'file_path': file_path,
+                        'file_name': os.path.basename(file_path),
+                        'file_size': file_size,
+                        'file_ext': file_ext,
+                        'rows': checkpoint['imported']
+                    })
+                    continue
+                resume_rows = checkpoint['rows']
+                file_rows = checkpoint['imported']
+                total_rows += file_rows
+                logger.info(f"从第 {resume_rows} 行恢复导入: {os.path.basename(file_path)}")
+            rows_read = 0
+            stopped = False
+            insert_header = None
+            insert_sql = None
+            positions = None
+            key_positions = None
+            numeric_positions = []
+            
             try:
-                if file_ext == '.csv':
-                    logger.info("使用CSV读取器")
-                    reader = pd.read_csv(file_path, chunksize=batch_size, low_memory=False, encoding_errors='replace')
-                elif file_ext in ['.xlsx', '.xls']:
-                    logger.info("使用Excel读取器")
-                    reader = pd.read_excel(file_path, chunksize=batch_size)
-                elif file_ext == '.txt':
-                    logger.info("使用TXT读取器")
-                    reader = pd.read_csv(file_path, chunksize=batch_size, sep='\t', low_memory=False, encoding_errors='replace')
+                if is_supported_input(file_path):
+                    logger.info(f"使用{file_ext}读取器")
+                    reader = self.open_reader(file_path, sizer.batch_size)
                 else:
                     error_msg = f"不支持的文件格式: {file_ext}"
                     logger.error(error_msg)
@@ -350,86 +1947,95 @@ class DataProcessor:
                         })
                     continue
                 
-                for i, chunk in enumerate(reader):
+                for chunk in self.iter_chunks(reader, sizer):
                     # 检查是否需要停止处理
                     if hasattr(self, 'is_processing') and not self.is_processing:
                         logger.info("处理被用户停止")
+                        stopped = True
                         break
+                    sizer.observe(len(chunk), chunk.memory_usage(index=False, deep=True).sum())
+                    
+                    # 跳过上次运行中已导入的行
+                    rows_read += len(chunk)
+                    if rows_read <= resume_rows:
+                        continue
+                    if rows_read - len(chunk) < resume_rows:
+                        chunk = chunk.iloc[resume_rows - (rows_read - len(chunk)):]
                     
                     chunk_count += 1
                     logger.info(f"处理数据块 {chunk_count}，大小: {len(chunk)} 行")
                     
                     try:
-                        # 清理数据
-                        chunk = chunk.dropna(axis=1, how='all')
-                        chunk = chunk.replace({np.nan: None})
-                        
                         # 验证数据不为空
                         if chunk.empty:
                             logger.info("数据块为空，跳过")
                             continue
                         
-                        # 验证列数
-                        if chunk.shape[1] == 0:
-                            error_msg = '文件中没有有效列'
-                            logger.warning(error_msg)
-                            if progress_callback:
-                                progress_callback({
-                                    'type': 'error',
-                                    'file': os.path.basename(file_path),
-                                    'error': error_msg
-                                })
-                            continue
-                        
-                        # 创建表（如果不存在）
-                        if i == 0:
-                            # 生成创建表的SQL
-                            columns = []
-                            for col in chunk.columns:
-                                # 清理列名
-                                clean_col = col.strip().replace(' ', '_').replace('-', '_').replace('.', '_')
-                                # 确保列名不为空
-                                if not clean_col:
-                                    clean_col = f"col_{len(columns)}"
-                                columns.append(f"{clean_col} TEXT")
-                            create_table_sql = f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(columns)})"
-                            
-                            try:
-                                logger.info(f"创建表: {table_name}")
-                                self.cursor.execute(create_table_sql)
-                                logger.info("表创建成功")
-                            except Exception as e:
-                                error_msg = f"创建表失败: {str(e)}"
-                                logger.error(error_msg)
+                        # 按列名对应到表的列：同一表头只计算一次插入语句和列位置，
+                        # SQL文本不变时 sqlite3 复用已编译的语句
+                        header = tuple(chunk.columns)
+                        if header != insert_header:
+                            insert_header = header
+                            names = self.clean_header(header)
+                            positions = [index for index, name in enumerate(names) if name in table_columns]
+                            if not positions:
+                                error_msg = '文件中没有有效列'
+                                logger.warning(error_msg)
                                 if progress_callback:
                                     progress_callback({
                                         'type': 'error',
+                                        'file': os.path.basename(file_path),
                                         'error': error_msg
                                     })
-                                continue
+                                break
+                            insert_names = [names[i] for i in positions]
+                            if self.normalization:
+                                # 规范化键按列名排序后的顺序拼接，与文件和表中的列顺序都无关，两个数据集的键可直接比较
+                                key_positions = [names.index(col) if col in names else None for col in sorted(column_order)]
+                                insert_names.append(NORMALIZED_KEY_COLUMN)
+                            insert_sql = (f"INSERT INTO {table_name} ({', '.join(insert_names)}) "
+                                          f"VALUES ({','.join('?' * len(insert_names))})")
+                            numeric = self.numeric_columns(table_name)
+                            numeric_positions = [(names[i], i, numeric[names[i]]) for i in positions if names[i] in numeric]
+                        
+                        # 类型只按采样推断：数值列中出现不能原样读出的值时，先把该列改为 TEXT 再插入
+                        lossy = [
+                            col for col, position, col_type in numeric_positions
+                            if lossy_value(chunk.iloc[:, position].to_numpy(dtype=object, na_value=None), col_type) is not None
+                        ]
+                        if lossy:
+                            self.widen_columns(lossy)
+                            numeric_positions = [item for item in numeric_positions if item[0] not in lossy]
+                        
+                        # 记录是否出现NULL值（含文件缺少的列），供去重时选择存储方式
+                        if len(positions) < len(table_columns) or chunk.isna().values.any():
+                            self.null_tables[table_name] = True
+                        else:
+                            self.null_tables.setdefault(table_name, False)
                         
                         # 插入数据
                         try:
-                            rows = chunk.values.tolist()
-                            placeholders = ','.join(['?' for _ in range(len(chunk.columns))])
-                            insert_sql = f"INSERT INTO {table_name} VALUES ({placeholders})"
-                            
                             # 批量插入
-                            logger.info(f"批量插入 {len(rows)} 行数据")
-                            self.cursor.executemany(insert_sql, rows)
+                            chunk_rows = len(chunk)
+                            logger.info(f"批量插入 {chunk_rows} 行数据")
+                            keys = normalized_keys(chunk, key_positions, self.normalization) if self.normalization else None
+                            self.cursor.executemany(insert_sql, self.iter_rows(chunk, positions, keys))
                             
-                            chunk_rows = len(rows)
                             total_rows += chunk_rows
                             file_rows += chunk_rows
+                            rows_since_commit += chunk_rows
+                            self.set_checkpoint(checkpoint_key, {'rows': rows_read, 'imported': file_rows, 'done': False})
                             
                             # 记录内存使用
                             current_memory = psutil.Process().memory_info().rss / 1024 / 1024  # MB
                             logger.info(f"当前内存使用: {current_memory:.2f} MB，增长: {current_memory - start_memory:.2f} MB")
                             
-                            # 每100万行commit一次，减少I/O操作
-                            if total_rows % 1000000 == 0:
+                            # 每100万行commit一次，减少I/O操作（数据块大小自适应，按上次提交后的累计行数判断）
+                            # 可恢复的任务每个数据块都提交，使检查点与该块数据一起落盘
+                            if self.job_id or rows_since_commit >= IMPORT_COMMIT_ROWS:
                                 logger.info("提交事务")
                                 self.conn.commit()
+                                rows_since_commit = 0
                                 # 重新开始事务
                                 self.conn.execute('BEGIN TRANSACTION')
                                 logger.info("事务重新开始")
@@ -448,6 +2054,10 @@ class DataProcessor:
                                     'memory': f'{current_memory:.2f} MB'
                                 })
                         except Exception as insert_error:
+                            if self.cancel_requested:
+                                logger.info("插入被取消")
+                                stopped = True
+                                break
                             error_msg = f"插入数据失败: {str(insert_error)}"
                             logger.error(error_msg)
                             if progress_callback:
@@ -471,11 +2081,15 @@ class DataProcessor:
                         # 记录错误但继续处理
                         continue
                 
+                if not stopped:
+                    self.set_checkpoint(checkpoint_key, {'rows': rows_read, 'imported': file_rows, 'done': True})
+                
                 # 最后commit一次
-                if total_rows > 0:
+                if total_rows > 0 or self.job_id:
                     try:
                         logger.info("提交最终事务")
                         self.conn.commit()
+                        rows_since_commit = 0
                         # 重新开始事务
                         self.conn.execute('BEGIN TRANSACTION')
                         logger.info("事务重新开始")
@@ -511,6 +2125,10 @@ class DataProcessor:
                 # 记录错误但继续处理其他文件
                 continue
         
+        # 恢复导入时本次只看到部分数据块，NULL记录不完整，去重时改为查询判断
+        if resumed and not self.null_tables.get(table_name):
+            self.null_tables.pop(table_name, None)
+        
         # 记录处理结果
         elapsed_time = time.time() - start_time
         end_memory = psutil.Process().memory_info().rss / 1024 / 1024  # MB
@@ -525,8 +2143,23 @@ class DataProcessor:
         
         return total_rows, file_info
     
+    def table_has_nulls(self, table_name, columns):
+        """判断表中是否存在NULL值，优先使用导入阶段记录的结果"""
+        if table_name in self.null_tables:
+            return self.null_tables[table_name]
+        null_check = ' OR '.join(f"{col} IS NULL" for col in columns)
+        self.cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name} WHERE {null_check})")
+        return bool(self.cursor.fetchone()[0])
+    
     def deduplicate(self, table_name, progress_callback=None):
         """去重"""
+        checkpoint = self.get_checkpoint(f"dedup:{table_name}")
+        if checkpoint:
+            logger.info(f"表 {table_name} 已在上次运行中去重，跳过")
+            return checkpoint['rows']
+        
+        self.governor.begin_stage(f"去重 {table_name}")
+        self.governor.plan_sort()
         try:
             # 验证表存在
             self.cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
@@ -535,7 +2168,8 @@ class DataProcessor:
             
             # 获取表结构
             self.cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [col[1] for col in self.cursor.fetchall()]
+            table_info = self.cursor.fetchall()
+            columns = [col[1] for col in table_info]
             
             if not columns:
                 raise ValueError(f"表 {table_name} 没有列")
@@ -544,8 +2178,34 @@ class DataProcessor:
             
             # 创建去重后的表
             deduped_table = f"{table_name}_deduped"
-            create_deduped_sql = f"CREATE TABLE {deduped_table} AS SELECT DISTINCT {columns_str} FROM {table_name}"
-            self.cursor.execute(create_deduped_sql)
+            self.cursor.execute(f"DROP TABLE IF EXISTS {deduped_table}")
+            if self.normalization:
+                # 按规范化键去重：以键为主键的 WITHOUT ROWID 表，每个键保留最先导入的原始行
+                logger.info(f"表 {table_name} 按规范化键去重，规则: {', '.join(self.normalization)}")
+                column_defs = ', '.join(f"{col[1]} {col[2] or 'TEXT'}" for col in table_info)
+                self.cursor.execute(
+                    f"CREATE TABLE {deduped_table} ({column_defs}, PRIMARY KEY ({NORMALIZED_KEY_COLUMN})) WITHOUT ROWID"
+                )
+                self.cursor.execute(
+                    f"INSERT OR IGNORE INTO {deduped_table} ({columns_str}) "
+                    f"SELECT {columns_str} FROM {table_name} ORDER BY rowid"
+                )
+            elif self.table_has_nulls(table_name, columns):
+                # 主键列不允许NULL，含NULL的表退回堆表 + 运算前建全列索引
+                logger.info(f"表 {table_name} 含NULL值，使用普通表去重")
+                create_deduped_sql = f"CREATE TABLE {deduped_table} AS SELECT DISTINCT {columns_str} FROM {table_name}"
+                self.cursor.execute(create_deduped_sql)
+            else:
+                # 聚簇存储：以全部比较列为主键的 WITHOUT ROWID 表，表本身即为索引，
+                # 主键约束同时完成去重，运算时无需再建一份全列索引
+                logger.info(f"表 {table_name} 使用 WITHOUT ROWID 聚簇表去重")
+                column_defs = ', '.join(f"{col[1]} {col[2] or 'TEXT'}" for col in table_info)
+                self.cursor.execute(
+                    f"CREATE TABLE {deduped_table} ({column_defs}, PRIMARY KEY ({columns_str})) WITHOUT ROWID"
+                )
+                self.cursor.execute(
+                    f"INSERT OR IGNORE INTO {deduped_table} ({columns_str}) SELECT {columns_str} FROM {table_name}"
+                )
             
             # 获取去重后的行数
             self.cursor.execute(f"SELECT COUNT(*) FROM {deduped_table}")
@@ -554,6 +2214,7 @@ class DataProcessor:
             # 删除原表并重新命名
             self.cursor.execute(f"DROP TABLE {table_name}")
             self.cursor.execute(f"ALTER TABLE {deduped_table} RENAME TO {table_name}")
+            self.set_checkpoint(f"dedup:{table_name}", {'rows': deduped_count})
             
             # 提交事务
             self.conn.commit()
@@ -576,7 +2237,293 @@ class DataProcessor:
                 self.conn.rollback()
                 # 重新开始事务
                 self.conn.execute('BEGIN TRANSACTION')
-            error_msg = f"去重时出错: {str(e)}"
+            error_msg = f"去重时出错: {str(e)}"
+            if progress_callback:
+                progress_callback({
+                    'type': 'error',
+                    'error': error_msg
+                })
+            raise ValueError(error_msg)
+    
+    def process_operation(self, table_a, table_b, operation, progress_callback=None):
+        """执行交并差运算"""
+        checkpoint = self.get_checkpoint('operation')
+        if checkpoint and checkpoint['operation'] == operation:
+            logger.info(f"运算 {operation} 已在上次运行中完成，跳过")
+            if checkpoint.get('regions'):
+                self.region_counts = checkpoint['regions']
+            return checkpoint['rows']
+        
+        self.governor.begin_stage(f"运算 {operation}")
+        self.governor.plan_sort()
+        try:
+            # 验证表存在
+            for table in [table_a, table_b]:
+                self.cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table}'")
+                if not self.cursor.fetchone():
+                    raise ValueError(f"表不存在: {table}")
+            
+            # 获取表结构（规范化键只用于比较，不输出）
+            columns = self.table_columns(table_a)
+            
+            if not columns:
+                raise ValueError(f"表 {table_a} 没有列")
+            
+            if self.normalization and set(columns) != set(self.table_columns(table_b)):
+                raise ValueError(f"按比较规则运算要求两个数据集的列相同: {table_a} {columns}，"
+                                 f"{table_b} {self.table_columns(table_b)}")
+            
+            columns_str = ','.join(columns)
+            
+            # 生成操作SQL
+            result_table = 'result'
+            temp_table = 'temp_result'
+            
+            # 先删除已存在的表
+            self.cursor.execute(f"DROP TABLE IF EXISTS {result_table}")
+            self.cursor.execute(f"DROP TABLE IF EXISTS {temp_table}")
+            
+            # 为表添加索引以提高性能
+            for table in [table_a, table_b]:
+                # 检查是否已存在索引（WITHOUT ROWID 表的主键索引只出现在 index_list 中）
+                self.cursor.execute(f"PRAGMA index_list({table})")
+                if not self.cursor.fetchone():
+                    # 创建索引
+                    index_name = f"idx_{table}_all"
+                    create_index_sql = f"CREATE INDEX {index_name} ON {table} ({columns_str})"
+                    self.cursor.execute(create_index_sql)
+            
+            # 提交索引创建
+            self.conn.commit()
+            self.conn.execute('BEGIN TRANSACTION')
+            
+            # 执行操作
+            if operation == 'split':
+                # 拆分 - 一次分类扫描同时得到 A-B、A∩B、B-A 三个区域
+                result_count = self._split_regions(table_a, table_b, columns_str)
+                
+                if progress_callback:
+                    progress_callback({
+                        'type': 'operation',
+                        'operation': operation,
+                        'processed': result_count,
+                        'total': result_count,
+                        'status': '运算完成'
+                    })
+                
+                return result_count
+            elif self.normalization:
+                # 按规范化键比较，输出原始行
+                sql = self.key_operation_sql(table_a, table_b, operation, columns_str, result_table)
+            elif operation == 'intersection':
+                # 交集 - 使用标准SQL INTERSECT操作，语义更明确
+                sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_a} INTERSECT SELECT {columns_str} FROM {table_b}"
+            elif operation == 'union':
+                # 并集
+                sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_a} UNION SELECT {columns_str} FROM {table_b}"
+            elif operation == 'differenceAB':
+                # 差集 A-B - 使用标准SQL EXCEPT操作，语义更明确
+                sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_a} EXCEPT SELECT {columns_str} FROM {table_b}"
+            elif operation == 'differenceBA':
+                # 差集 B-A - 使用标准SQL EXCEPT操作，语义更明确
+                sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_b} EXCEPT SELECT {columns_str} FROM {table_a}"
+            elif operation == 'symmetricDifference':
+                # 对称差 A△B - 两个表均已去重，A-B 与 B-A 互不相交，可直接 UNION ALL
+                sql = (f"CREATE TABLE {result_table} AS "
+                       f"SELECT {columns_str} FROM (SELECT {columns_str} FROM {table_a} EXCEPT SELECT {columns_str} FROM {table_b}) "
+                       f"UNION ALL "
+                       f"SELECT {columns_str} FROM (SELECT {columns_str} FROM {table_b} EXCEPT SELECT {columns_str} FROM {table_a})")
+            else:
+                raise ValueError(f"不支持的操作: {operation}")
+            
+            # 执行操作
+            self.cursor.execute(sql)
+            
+            # 获取结果行数
+            self.cursor.execute(f"SELECT COUNT(*) FROM {result_table}")
+            result_count = self.cursor.fetchone()[0]
+            self.set_checkpoint('operation', {'operation': operation, 'rows': result_count})
+            
+            # 提交事务
+            self.conn.commit()
+            
+            # 重新开始事务
+            self.conn.execute('BEGIN TRANSACTION')
+            
+            if progress_callback:
+                progress_callback({
+                    'type': 'operation',
+                    'operation': operation,
+                    'processed': result_count,
+                    'total': result_count,
+                    'status': '运算完成'
+                })
+            
+            return result_count
+        except Exception as e:
+            # 回滚事务
+            if self.conn:
+                self.conn.rollback()
+                # 重新开始事务
+                self.conn.execute('BEGIN TRANSACTION')
+            error_msg = f"执行运算时出错: {str(e)}"
+            if progress_callback:
+                progress_callback({
+                    'type': 'error',
+                    'error': error_msg
+                })
+            raise ValueError(error_msg)
+    
+    def probe_plan(self, files_a, files_b, operation):
+        """判断是否使用探测模式，返回作为小数据集导入的表名（table_a / table_b），不适用时返回None
+        
+        只输出小数据集一侧行的运算才适用：交集任一侧均可，差集只能是被减的一侧；
+        大数据集的输入须至少是小数据集的 PROBE_SIZE_RATIO 倍，且小数据集的哈希集合不超出内存预算。
+        """
+        sizes = {'table_a': self.input_size(files_a), 'table_b': self.input_size(files_b)}
+        for small_table in PROBE_OPERATIONS.get(operation, []):
+            big_table = 'table_b' if small_table == 'table_a' else 'table_a'
+            if not sizes[small_table] or sizes[big_table] < sizes[small_table] * PROBE_SIZE_RATIO:
+                continue
+            if not self.governor.allow_in_process(sizes[small_table] * PROBE_MEMORY_FACTOR, "不使用探测模式，完整导入两个数据集"):
+                return None
+            logger.info(f"使用探测模式: {small_table} 装入内存，另一数据集 {sizes[big_table] / 1024 / 1024:.0f} MB 流式读取")
+            self.run_report['probe'] = {'small_table': small_table, 'small_bytes': sizes[small_table],
+                                        'big_bytes': sizes[big_table]}
+            return small_table
+        return None
+    
+    def probe_operation(self, small_table, big_files, operation, progress_callback=None):
+        """探测模式运算：已导入并去重的小数据集装入内存哈希集合，大数据集的文件逐块读取并查找，不写入SQLite
+        
+        大数据集的值按小数据集的列类型做与导入相同的转换（不能无损转换的值保留原文本，启用比较规则时计算规范化键），
+        比较结果与完整导入后运算一致；
+        只把小数据集中匹配（交集）或未匹配（差集）的原始行写入 result 表。小数据集的行全部匹配后提前结束读取。
+        """
+        checkpoint = self.get_checkpoint('operation')
+        if checkpoint and checkpoint['operation'] == operation:
+            logger.info(f"运算 {operation} 已在上次运行中完成，跳过")
+            return checkpoint['rows']
+        
+        self.governor.begin_stage(f"探测 {operation}")
+        try:
+            self.cursor.execute(f"PRAGMA table_info({small_table})")
+            table_info = [col for col in self.cursor.fetchall() if col[1] != NORMALIZED_KEY_COLUMN]
+            columns = [col[1] for col in table_info]
+            if not columns:
+                raise ValueError(f"表 {small_table} 没有列")
+            
+            # 大数据集的列：按列名对应，某个文件缺少的列按NULL比较（与导入时一致）
+            big_columns = self.dataset_columns(big_files)
+            if self.normalization and set(big_columns) != set(columns):
+                raise ValueError(f"按比较规则运算要求两个数据集的列相同: {columns}，{big_columns}")
+            # 与完整运算一致：按数据集A的列比较和输出，数据集B须包含这些列
+            a_columns, b_columns = (columns, big_columns) if small_table == 'table_a' else (big_columns, columns)
+            missing = [col for col in a_columns if col not in b_columns]
+            if missing:
+                raise ValueError(f"数据集B缺少列: {', '.join(missing)}")
+            columns = a_columns
+            
+            # 小数据集装入哈希集合：启用比较规则时为规范化键，否则为整行
+            if self.normalization:
+                probe_columns = sorted(columns)
+                lookup = {row[0] for row in self.conn.execute(f"SELECT {NORMALIZED_KEY_COLUMN} FROM {small_table}")}
+            else:
+                probe_columns = columns
+                declared = {col[1]: (col[2] or 'TEXT').upper() for col in table_info}
+                column_types = [declared[col] for col in columns]
+                lookup = set(self.conn.execute(f"SELECT DISTINCT {','.join(columns)} FROM {small_table}"))
+            logger.info(f"小数据集 {small_table} 装入哈希集合: {len(lookup)} 行")
+            self.governor.check()
+            
+            found = set()
+            streamed = 0
+            sizer = BatchSizer(self.governor, f"探测 {operation}")
+            for file_path in big_files:
+                if not self.is_processing or len(found) == len(lookup):
+                    break
+                if not is_supported_input(file_path):
+                    logger.warning(f"不支持的文件格式，跳过: {file_path}")
+                    continue
+                header = None
+                for chunk in self.iter_chunks(self.open_reader(file_path, sizer.batch_size), sizer):
+                    if not self.is_processing:
+                        break
+                    sizer.observe(len(chunk), chunk.memory_usage(index=False, deep=True).sum())
+                    if tuple(chunk.columns) != header:
+                        header = tuple(chunk.columns)
+                        names = self.clean_header(header)
+                        positions = [names.index(col) if col in names else None for col in probe_columns]
+                    if self.normalization:
+                        rows = normalized_keys(chunk, positions, self.normalization)
+                    else:
+                        values = [
+                            [stored_value(v, col_type) for v in chunk.iloc[:, position].to_numpy(dtype=object, na_value=None)]
+                            if position is not None else [None] * len(chunk)
+                            for position, col_type in zip(positions, column_types)
+                        ]
+                        rows = zip(*values)
+                    found.update(lookup.intersection(rows))
+                    streamed += len(chunk)
+                    
+                    if progress_callback:
+                        progress_callback({
+                            'type': 'import',
+                            'file': os.path.basename(file_path),
+                            'processed': streamed,
+                            'total': streamed,
+                            'status': f'探测 {os.path.basename(file_path)}，已匹配 {len(found)}/{len(lookup)} 行'
+                        })
+                    if len(found) == len(lookup):
+                        logger.info("小数据集的行已全部匹配，提前结束读取")
+                        break
+            
+            if not self.is_processing:
+                logger.info("探测被用户停止")
+                return 0
+            
+            # 物化小数据集中匹配或未匹配的原始行
+            keep_matched = operation == 'intersection'
+            columns_str = ','.join(columns)
+            result_table = 'result'
+            self.cursor.execute(f"DROP TABLE IF EXISTS {result_table}")
+            self.cursor.execute(f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {small_table} WHERE 0")
+            insert_sql = f"INSERT INTO {result_table} VALUES ({','.join('?' * len(columns))})"
+            if self.normalization:
+                rows = self.conn.execute(f"SELECT {columns_str}, {NORMALIZED_KEY_COLUMN} FROM {small_table}")
+                self.cursor.executemany(insert_sql, (row[:-1] for row in rows if (row[-1] in found) == keep_matched))
+            else:
+                rows = self.conn.execute(f"SELECT DISTINCT {columns_str} FROM {small_table}")
+                self.cursor.executemany(insert_sql, (row for row in rows if (row in found) == keep_matched))
+            
+            result_count = len(found) if keep_matched else len(lookup) - len(found)
+            logger.info(f"探测完成: 读取 {streamed} 行，匹配 {len(found)} 行，结果 {result_count} 行")
+            self.run_report.setdefault('probe', {}).update({'streamed_rows': streamed, 'matched_rows': len(found)})
+            self.set_checkpoint('operation', {'operation': operation, 'rows': result_count})
+            
+            # 提交事务
+            self.conn.commit()
+            
+            # 重新开始事务
+            self.conn.execute('BEGIN TRANSACTION')
+            
+            if progress_callback:
+                progress_callback({
+                    'type': 'operation',
+                    'operation': operation,
+                    'processed': result_count,
+                    'total': result_count,
+                    'status': '运算完成'
+                })
+            
+            return result_count
+        except Exception as e:
+            # 回滚事务
+            if self.conn:
+                self.conn.rollback()
+                # 重新开始事务
+                self.conn.execute('BEGIN TRANSACTION')
+            error_msg = f"执行运算时出错: {str(e)}"
             if progress_callback:
                 progress_callback({
                     'type': 'error',
@@ -584,74 +2531,93 @@ class DataProcessor:
                 })
             raise ValueError(error_msg)
     
-    def process_operation(self, table_a, table_b, operation, progress_callback=None):
-        """执行交并差运算"""
+    def dataset_columns(self, file_paths):
+        """数据集全部文件表头中的列名，按首次出现的顺序"""
+        columns = []
+        for file_path in file_paths:
+            if not isinstance(file_path, str) or not os.path.isfile(file_path) or not is_supported_input(file_path):
+                continue
+            for header in self.read_headers(file_path):
+                columns.extend(name for name in header if name and name not in columns)
+        return columns
+    
+    def get_delta_state(self, key):
+        """读取增量库的状态"""
+        self.cursor.execute("SELECT value FROM delta_state WHERE key = ?", (key,))
+        row = self.cursor.fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set_delta_state(self, key, value):
+        """写入增量库的状态（随当前事务一起提交）"""
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO delta_state (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False))
+        )
+    
+    def delta_refresh(self, files_a, files_b, operation, column_types=None, progress_callback=None):
+        """增量模式：把两个数据集相对上次运行的变化应用到增量库并更新结果表，返回结果行数
+        
+        按文件指纹（路径、大小、修改时间）找出删除、变化和新增的分片：删除和变化的分片减去其中各行的引用计数，
+        变化和新增的分片重新读取后加上引用计数。引用计数在0与非0之间变化的行才会改变集合，结果表中只重算这些行的键，
+        耗时与变化量成正比。列、比较规则或列类型覆盖配置变化时重建增量库。需先以 delta_id 调用 init_db。
+        """
+        if operation not in OPERATION_REGIONS and operation != 'split':
+            raise ValueError(f"不支持的操作: {operation}")
+        
+        self.governor.begin_stage(f"增量 {operation}")
         try:
-            # 验证表存在
-            for table in [table_a, table_b]:
-                self.cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table}'")
-                if not self.cursor.fetchone():
-                    raise ValueError(f"表不存在: {table}")
-            
-            # 获取表结构
-            self.cursor.execute(f"PRAGMA table_info({table_a})")
-            columns = [col[1] for col in self.cursor.fetchall()]
+            for sql in [
+                "CREATE TABLE IF NOT EXISTS delta_state (key TEXT PRIMARY KEY, value TEXT)",
+                "CREATE TABLE IF NOT EXISTS delta_shards (shard INTEGER PRIMARY KEY, side INTEGER, path TEXT, size INTEGER, mtime INTEGER)",
+                "CREATE TABLE IF NOT EXISTS delta_members (shard INTEGER, id INTEGER, PRIMARY KEY (shard, id)) WITHOUT ROWID",
+                # 本次（或中断的上次）运行中被增减过引用的行，及其变化前是否存在
+                "CREATE TABLE IF NOT EXISTS delta_touched (id INTEGER PRIMARY KEY, was_live INTEGER)"
+            ]:
+                self.cursor.execute(sql)
             
+            # 与完整运算一致：按数据集A的列比较和输出，数据集B须包含这些列
+            columns = self.dataset_columns(files_a)
+            columns_b = self.dataset_columns(files_b)
             if not columns:
-                raise ValueError(f"表 {table_a} 没有列")
-            
-            columns_str = ','.join(columns)
-            
-            # 生成操作SQL
-            result_table = 'result'
-            temp_table = 'temp_result'
-            
-            # 先删除已存在的表
-            self.cursor.execute(f"DROP TABLE IF EXISTS {result_table}")
-            self.cursor.execute(f"DROP TABLE IF EXISTS {temp_table}")
-            
-            # 为表添加索引以提高性能
-            for table in [table_a, table_b]:
-                # 检查是否已存在索引
-                self.cursor.execute(f"SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='{table}'")
-                if not self.cursor.fetchone():
-                    # 创建索引
-                    index_name = f"idx_{table}_all"
-                    create_index_sql = f"CREATE INDEX {index_name} ON {table} ({columns_str})"
-                    self.cursor.execute(create_index_sql)
-            
-            # 提交索引创建
-            self.conn.commit()
-            self.conn.execute('BEGIN TRANSACTION')
+                raise ValueError("数据集A没有有效列")
+            if self.normalization and set(columns) != set(columns_b):
+                raise ValueError(f"按比较规则运算要求两个数据集的列相同: {columns}，{columns_b}")
+            missing = [col for col in columns if col not in columns_b]
+            if missing:
+                raise ValueError(f"数据集B缺少列: {', '.join(missing)}")
+            reserved = [col for col in columns if col in DELTA_RESERVED_COLUMNS]
+            if reserved:
+                raise ValueError(f"列名与增量库的内部列冲突: {', '.join(reserved)}")
             
-            # 执行操作
-            if operation == 'intersection':
-                # 交集 - 使用标准SQL INTERSECT操作，语义更明确
-                sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_a} INTERSECT SELECT {columns_str} FROM {table_b}"
-            elif operation == 'union':
-                # 并集
-                sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_a} UNION SELECT {columns_str} FROM {table_b}"
-            elif operation == 'differenceAB':
-                # 差集 A-B - 使用标准SQL EXCEPT操作，语义更明确
-                sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_a} EXCEPT SELECT {columns_str} FROM {table_b}"
-            elif operation == 'differenceBA':
-                # 差集 B-A - 使用标准SQL EXCEPT操作，语义更明确
-                sql = f"CREATE TABLE {result_table} AS SELECT {columns_str} FROM {table_b} EXCEPT SELECT {columns_str} FROM {table_a}"
+            # 列类型沿用增量库中的记录，避免每次采样推断结果不同导致重建；类型覆盖配置变化时重建
+            config = {
+                'version': DELTA_STORE_VERSION,
+                'columns': columns,
+                'normalization': self.normalization,
+                'overrides': self.load_schema_overrides(files_a + files_b)
+            }
+            stored = self.get_delta_state('config')
+            rebuilt = not (stored and all(stored.get(key) == value for key, value in config.items()))
+            if not rebuilt:
+                types = stored['types']
             else:
-                raise ValueError(f"不支持的操作: {operation}")
-            
-            # 执行操作
-            self.cursor.execute(sql)
-            
-            # 获取结果行数
-            self.cursor.execute(f"SELECT COUNT(*) FROM {result_table}")
-            result_count = self.cursor.fetchone()[0]
+                types = [(column_types or {}).get(col, 'TEXT') for col in columns]
+                self.rebuild_delta_store(columns, types)
+                self.set_delta_state('config', dict(config, types=types))
+                self.conn.commit()
+                self.conn.execute('BEGIN TRANSACTION')
+            self.run_report['delta'] = {'rebuilt': rebuilt}
+            results = self.get_delta_state('results')
+            self.delta_tracking = bool(results) and results['operation'] == operation
             
-            # 提交事务
-            self.conn.commit()
+            rows_read = 0
+            for table_name, file_paths in [('table_a', files_a), ('table_b', files_b)]:
+                rows_read = self.delta_apply(table_name, file_paths, columns, types, rows_read, progress_callback)
+                if not self.is_processing:
+                    logger.info("增量更新被用户停止")
+                    return 0
             
-            # 重新开始事务
-            self.conn.execute('BEGIN TRANSACTION')
+            result_count = self.delta_results(operation, columns, types)
             
             if progress_callback:
                 progress_callback({
@@ -669,7 +2635,7 @@ class DataProcessor:
                 self.conn.rollback()
                 # 重新开始事务
                 self.conn.execute('BEGIN TRANSACTION')
-            error_msg = f"执行运算时出错: {str(e)}"
+            error_msg = f"增量更新时出错: {str(e)}"
             if progress_callback:
                 progress_callback({
                     'type': 'error',
@@ -677,8 +2643,655 @@ class DataProcessor:
                 })
             raise ValueError(error_msg)
     
-    def export_result(self, output_path, export_format, progress_callback=None):
-        """导出结果"""
+    def rebuild_delta_store(self, columns, column_types):
+        """清空增量库并按新的列结构建表，之后全部分片按新增处理"""
+        logger.info(f"重建增量库: {self.temp_db}")
+        for table in ['delta_rows', 'delta_regions', 'result'] + list(SPLIT_REGIONS.values()):
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        for table in ['delta_shards', 'delta_members', 'delta_touched']:
+            self.cursor.execute(f"DELETE FROM {table}")
+        self.cursor.execute("DELETE FROM delta_state WHERE key = 'results'")
+        
+        # 每个数据集的每个不同原始行一行，_refs 为包含它的分片数，为0时该行已不在数据集中
+        definitions = [f"{col} {col_type}" for col, col_type in zip(columns, column_types)]
+        definitions.append(f"{NORMALIZED_KEY_COLUMN} TEXT")
+        if self.normalization:
+            definitions.append(f"{ROW_KEY_COLUMN} TEXT")
+        self.cursor.execute(f"CREATE TABLE delta_rows (_id INTEGER PRIMARY KEY, _side INTEGER, {', '.join(definitions)}, _refs INTEGER)")
+        if self.normalization:
+            # 规范化键按原始文本计算，存储值相同的两行（如整数列的 5 与 5.0）规范化键可能不同，按两个键一起区分
+            self.cursor.execute(f"CREATE UNIQUE INDEX delta_rows_row ON delta_rows ({ROW_KEY_COLUMN}, {NORMALIZED_KEY_COLUMN}, _side)")
+        self.cursor.execute(f"CREATE {'' if self.normalization else 'UNIQUE '}INDEX delta_rows_key ON delta_rows ({NORMALIZED_KEY_COLUMN}, _side)")
+    
+    def delta_apply(self, table_name, file_paths, columns, column_types, rows_read=0, progress_callback=None):
+        """把一侧数据集的分片变化应用到增量库，返回累计读取的行数"""
+        side = DELTA_SIDES[table_name]
+        current = {}
+        for file_path in file_paths:
+            if not isinstance(file_path, str) or not os.path.isfile(file_path) or not is_supported_input(file_path):
+                logger.warning(f"文件不存在或格式不支持，按已删除处理: {file_path}")
+                continue
+            path, size, mtime = file_fingerprint(file_path)
+            current[path] = (size, mtime)
+        self.cursor.execute("SELECT shard, path, size, mtime FROM delta_shards WHERE side = ?", (side,))
+        stored = {path: (shard, (size, mtime)) for shard, path, size, mtime in self.cursor.fetchall()}
+        
+        removed = [shard for path, (shard, fingerprint) in stored.items() if current.get(path) != fingerprint]
+        added = [path for path, fingerprint in current.items() if path not in stored or stored[path][1] != fingerprint]
+        changed = len([path for path in added if path in stored])
+        logger.info(f"{table_name} 增量: {len(current)} 个分片，删除 {len(removed) - changed}，变化 {changed}，"
+                    f"新增 {len(added) - changed}")
+        
+        for shard in removed:
+            self.release_delta_shard(shard)
+        for path in added:
+            if not self.is_processing:
+                break
+            rows_read = self.load_delta_shard(side, path, current[path], columns, column_types, rows_read, progress_callback)
+        
+        self.run_report.setdefault('delta', {})[table_name] = {
+            'shards': len(current),
+            'removed': len(removed) - changed,
+            'changed': changed,
+            'added': len(added) - changed
+        }
+        return rows_read
+    
+    def touch_delta_shard(self, shard):
+        """记录分片中各行被改动前是否存在，结果表据此只更新存在性变化的键"""
+        if not self.delta_tracking:
+            return
+        self.cursor.execute(
+            "INSERT OR IGNORE INTO delta_touched (id, was_live) "
+            "SELECT r._id, r._refs > 0 FROM delta_members m JOIN delta_rows r ON r._id = m.id WHERE m.shard = ?", (shard,)
+        )
+    
+    def release_delta_shard(self, shard):
+        """移除一个分片：其中各行的引用计数减1"""
+        self.touch_delta_shard(shard)
+        self.cursor.execute("UPDATE delta_rows SET _refs = _refs - 1 WHERE _id IN (SELECT id FROM delta_members WHERE shard = ?)", (shard,))
+        self.cursor.execute("DELETE FROM delta_members WHERE shard = ?", (shard,))
+        self.cursor.execute("DELETE FROM delta_shards WHERE shard = ?", (shard,))
+        self.conn.commit()
+        self.conn.execute('BEGIN TRANSACTION')
+    
+    def load_delta_shard(self, side, file_path, fingerprint, columns, column_types, rows_read, progress_callback=None):
+        """读取一个新增或变化的分片：新出现的行插入增量库，分片中各行的引用计数加1
+        
+        值按列类型做与导入相同的转换后计算原始行键，启用比较规则时另计算规范化键；出现有损值的列改为 TEXT。
+        每个数据块先写入无索引的暂存表，再用两条语句插入新行和分片成员，避免逐行执行查找语句。
+        整个分片在一个事务中提交，中断时回滚，下次运行重新读取。
+        """
+        file_name = os.path.basename(file_path)
+        key_columns = [NORMALIZED_KEY_COLUMN] + ([ROW_KEY_COLUMN] if self.normalization else [])
+        value_columns = columns + key_columns
+        values_str = ', '.join(value_columns)
+        sort_index = sorted(range(len(columns)), key=columns.__getitem__)
+        try:
+            self.cursor.execute(
+                "INSERT INTO delta_shards (side, path, size, mtime) VALUES (?, ?, ?, ?)", (side, file_path, *fingerprint)
+            )
+            shard = self.cursor.lastrowid
+            self.cursor.execute("DROP TABLE IF EXISTS temp.delta_staged")
+            self.cursor.execute(f"CREATE TEMP TABLE delta_staged AS SELECT {values_str} FROM delta_rows WHERE 0")
+            stage_sql = f"INSERT INTO delta_staged VALUES ({','.join('?' * len(value_columns))})"
+            insert_sql = (f"INSERT OR IGNORE INTO delta_rows (_side, {values_str}, _refs) "
+                          f"SELECT {side}, {values_str}, 0 FROM delta_staged ORDER BY rowid")
+            member_sql = (f"INSERT OR IGNORE INTO delta_members (shard, id) "
+                          f"SELECT {shard}, r._id FROM delta_staged s JOIN delta_rows r ON "
+                          f"{' AND '.join(f'r.{col} = s.{col}' for col in key_columns)} AND r._side = {side}")
+            
+            sizer = BatchSizer(self.governor, f"增量导入 {file_name}")
+            header = None
+            for chunk in self.iter_chunks(self.open_reader(file_path, sizer.batch_size), sizer):
+                if not self.is_processing:
+                    # 未读完的分片不记录，下次运行重新读取
+                    self.conn.rollback()
+                    self.conn.execute('BEGIN TRANSACTION')
+                    return rows_read
+                sizer.observe(len(chunk), chunk.memory_usage(index=False, deep=True).sum())
+                if chunk.empty:
+                    continue
+                if tuple(chunk.columns) != header:
+                    header = tuple(chunk.columns)
+                    names = self.clean_header(header)
+                    positions = [names.index(col) if col in names else None for col in columns]
+                
+                # 数值列中出现不能原样读出的值时把该列改为 TEXT，增量库中已有的行随之重建，列类型记录同步更新
+                lossy = [
+                    columns[i] for i, (position, col_type) in enumerate(zip(positions, column_types))
+                    if position is not None and col_type != 'TEXT' and lossy_value(
+                        chunk.iloc[:, position].to_numpy(dtype=object, na_value=None), col_type
+                    ) is not None
+                ]
+                if lossy:
+                    self.widen_columns(lossy)
+                    column_types[:] = ['TEXT' if col in lossy else col_type for col, col_type in zip(columns, column_types)]
+                    self.set_delta_state('config', dict(self.get_delta_state('config'), types=column_types))
+                    self.cursor.execute("DROP TABLE temp.delta_staged")
+                    self.cursor.execute(f"CREATE TEMP TABLE delta_staged AS SELECT {values_str} FROM delta_rows WHERE 0")
+                
+                values = []
+                for position, col_type in zip(positions, column_types):
+                    if position is None:
+                        values.append([None] * len(chunk))
+                        continue
+                    column = chunk.iloc[:, position].to_numpy(dtype=object, na_value=None).tolist()
+                    values.append(column if col_type == 'TEXT' else [affinity_value(v, col_type) for v in column])
+                raw_keys = row_keys([values[i] for i in sort_index])
+                if self.normalization:
+                    keys = normalized_keys(chunk, [positions[i] for i in sort_index], self.normalization)
+                    self.cursor.executemany(stage_sql, zip(*values, keys, raw_keys))
+                else:
+                    self.cursor.executemany(stage_sql, zip(*values, raw_keys))
+                self.cursor.execute(insert_sql)
+                self.cursor.execute(member_sql)
+                self.cursor.execute("DELETE FROM delta_staged")
+                rows_read += len(chunk)
+                
+                if progress_callback:
+                    progress_callback({
+                        'type': 'import',
+                        'file': file_name,
+                        'processed': rows_read,
+                        'total': rows_read,
+                        'status': f'增量导入 {file_name}'
+                    })
+            
+            self.touch_delta_shard(shard)
+            self.cursor.execute("UPDATE delta_rows SET _refs = _refs + 1 WHERE _id IN (SELECT id FROM delta_members WHERE shard = ?)", (shard,))
+            self.cursor.execute("DROP TABLE temp.delta_staged")
+            self.conn.commit()
+            self.conn.execute('BEGIN TRANSACTION')
+            logger.info(f"增量导入完成: {file_name}")
+            return rows_read
+        except Exception as e:
+            self.conn.rollback()
+            self.conn.execute('BEGIN TRANSACTION')
+            raise ValueError(f"导入文件 {file_name} 时出错: {str(e)}")
+    
+    def delta_results(self, operation, columns, column_types):
+        """更新结果表：只删除并重新插入存在性变化的行所在的键，运算变化或结果表缺失时全部重建
+        
+        每个键的区域为其在两侧存在的标记位之和；输出行与完整运算一致，含A的区域取A中最先导入的原始行，
+        仅B的区域取B中的。结果表的 rowid 即输出行在增量库中的 id，删除时据此定位。
+        """
+        tables = dict(SPLIT_REGIONS) if operation == 'split' else {operation: 'result'}
+        columns_str = ','.join(columns)
+        self.cursor.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({','.join('?' * len(tables))})",
+            list(tables.values())
+        )
+        rebuild = not self.delta_tracking or self.cursor.fetchone()[0] != len(tables)
+        deleted = {table: 0 for table in tables.values()}
+        
+        self.cursor.execute("DROP TABLE IF EXISTS delta_regions")
+        self.cursor.execute("DROP TABLE IF EXISTS delta_changed")
+        if rebuild:
+            logger.info(f"重建结果表: {operation}")
+            definitions = ', '.join(f"{col} {col_type}" for col, col_type in zip(columns, column_types))
+            for table in ['result'] + list(SPLIT_REGIONS.values()):
+                self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            for table in tables.values():
+                self.cursor.execute(f"CREATE TABLE {table} ({definitions})")
+            counts = {table: 0 for table in tables.values()}
+            key_filter = ''
+            changed = None
+            # 清理已不在任何分片中的行
+            self.cursor.execute("DELETE FROM delta_rows WHERE _refs = 0")
+        else:
+            # 存在性变化的行所在的键：其区域或输出的原始行可能改变
+            self.cursor.execute(
+                f"CREATE TABLE delta_changed AS SELECT DISTINCT r.{NORMALIZED_KEY_COLUMN} FROM delta_touched t "
+                f"JOIN delta_rows r ON r._id = t.id WHERE t.was_live != (r._refs > 0)"
+            )
+            self.cursor.execute("SELECT COUNT(*) FROM delta_changed")
+            changed = self.cursor.fetchone()[0]
+            counts = dict(self.get_delta_state('results')['rows'])
+            key_filter = f"AND {NORMALIZED_KEY_COLUMN} IN (SELECT {NORMALIZED_KEY_COLUMN} FROM delta_changed)"
+            for table in tables.values():
+                self.cursor.execute(
+                    f"DELETE FROM {table} WHERE rowid IN (SELECT _id FROM delta_rows "
+                    f"WHERE {NORMALIZED_KEY_COLUMN} IN (SELECT {NORMALIZED_KEY_COLUMN} FROM delta_changed))"
+                )
+                deleted[table] = self.cursor.rowcount
+                counts[table] -= deleted[table]
+            # 结果行已按 id 删除，再清理已不在任何分片中的行
+            self.cursor.execute("DELETE FROM delta_rows WHERE _refs = 0 AND _id IN (SELECT id FROM delta_touched)")
+        
+        # 剩下的行都存在，按键分组只需扫描键索引
+        self.cursor.execute(
+            f"CREATE TABLE delta_regions AS "
+            f"SELECT region, CASE WHEN region = 2 THEN b_id ELSE a_id END AS id FROM ("
+            f"SELECT SUM(DISTINCT _side) AS region, MIN(CASE WHEN _side = 1 THEN _id END) AS a_id, "
+            f"MIN(CASE WHEN _side = 2 THEN _id END) AS b_id "
+            f"FROM delta_rows WHERE 1 {key_filter} GROUP BY {NORMALIZED_KEY_COLUMN})"
+        )
+        report = {}
+        for region, table in tables.items():
+            self.cursor.execute(
+                f"INSERT INTO {table} (rowid, {columns_str}) "
+                f"SELECT r._id, {', '.join(f'r.{col}' for col in columns)} FROM delta_regions g JOIN delta_rows r ON r._id = g.id "
+                f"WHERE g.region IN ({','.join(map(str, OPERATION_REGIONS[region]))}) ORDER BY r._id"
+            )
+            counts[table] += self.cursor.rowcount
+            report[table] = {'rows': counts[table], 'inserted': self.cursor.rowcount, 'deleted': deleted[table]}
+            logger.info(f"结果表 {table}: {report[table]}")
+        
+        self.cursor.execute("DELETE FROM delta_touched")
+        self.cursor.execute("DROP TABLE delta_regions")
+        self.cursor.execute("DROP TABLE IF EXISTS delta_changed")
+        self.set_delta_state('results', {'operation': operation, 'rows': counts})
+        self.run_report.setdefault('delta', {}).update({'changed_keys': changed, 'results': report})
+        
+        # 提交事务
+        self.conn.commit()
+        
+        # 重新开始事务
+        self.conn.execute('BEGIN TRANSACTION')
+        
+        if operation == 'split':
+            self.region_counts = {region: counts[table] for region, table in tables.items()}
+        return sum(counts.values())
+    
+    def key_match(self, outer, inner, negate=False):
+        """outer 表的行在 inner 表中是否有相同规范化键的条件，走 inner 的主键索引"""
+        return (f"{'NOT ' if negate else ''}EXISTS (SELECT 1 FROM {inner} "
+                f"WHERE {inner}.{NORMALIZED_KEY_COLUMN} = {outer}.{NORMALIZED_KEY_COLUMN})")
+    
+    def key_operation_sql(self, table_a, table_b, operation, columns_str, result_table):
+        """按规范化键运算的建表SQL：匹配的行取A中的原始行，并集中B独有的行取B中的原始行"""
+        a_only = f"SELECT {columns_str} FROM {table_a} WHERE {self.key_match(table_a, table_b, negate=True)}"
+        b_only = f"SELECT {columns_str} FROM {table_b} WHERE {self.key_match(table_b, table_a, negate=True)}"
+        if operation == 'intersection':
+            query = f"SELECT {columns_str} FROM {table_a} WHERE {self.key_match(table_a, table_b)}"
+        elif operation == 'union':
+            query = f"SELECT {columns_str} FROM {table_a} UNION ALL {b_only}"
+        elif operation == 'differenceAB':
+            query = a_only
+        elif operation == 'differenceBA':
+            query = b_only
+        elif operation == 'symmetricDifference':
+            query = f"{a_only} UNION ALL {b_only}"
+        else:
+            raise ValueError(f"不支持的操作: {operation}")
+        return f"CREATE TABLE {result_table} AS {query}"
+    
+    def _split_regions(self, table_a, table_b, columns_str):
+        """按维恩区域拆分结果，写入 SPLIT_REGIONS 中的三个结果表"""
+        region_table = 'result_regions'
+        self.cursor.execute(f"DROP TABLE IF EXISTS {region_table}")
+        for table in SPLIT_REGIONS.values():
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        
+        if self.normalization:
+            # 按规范化键在对方表的主键索引上查找，各区域直接取原始行
+            logger.info("按规范化键拆分维恩区域")
+            queries = {
+                region: self.key_operation_sql(table_a, table_b, region, columns_str, table)
+                for region, table in SPLIT_REGIONS.items()
+            }
+        else:
+            # 单次分类扫描：两个表均已去重，同一行在A中记1、在B中记2，求和后
+            # 1 = 仅A，2 = 仅B，3 = 两者都有（GROUP BY 与 INTERSECT/EXCEPT 一样将 NULL 视为相等）
+            logger.info("开始维恩区域分类扫描")
+            self.cursor.execute(
+                f"CREATE TABLE {region_table} AS "
+                f"SELECT {columns_str}, SUM(_src) AS _region FROM ("
+                f"SELECT {columns_str}, 1 AS _src FROM {table_a} "
+                f"UNION ALL "
+                f"SELECT {columns_str}, 2 AS _src FROM {table_b}"
+                f") GROUP BY {columns_str}"
+            )
+            region_codes = {'differenceAB': 1, 'differenceBA': 2, 'intersection': 3}
+            queries = {
+                region: f"CREATE TABLE {table} AS SELECT {columns_str} FROM {region_table} WHERE _region = {region_codes[region]}"
+                for region, table in SPLIT_REGIONS.items()
+            }
+        
+        self.region_counts = {}
+        for region, table in SPLIT_REGIONS.items():
+            self.cursor.execute(queries[region])
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            self.region_counts[region] = self.cursor.fetchone()[0]
+            logger.info(f"区域 {region} 行数: {self.region_counts[region]}")
+        
+        self.cursor.execute(f"DROP TABLE IF EXISTS {region_table}")
+        self.set_checkpoint('operation', {
+            'operation': 'split',
+            'rows': sum(self.region_counts.values()),
+            'regions': self.region_counts
+        })
+        
+        # 提交事务
+        self.conn.commit()
+        
+        # 重新开始事务
+        self.conn.execute('BEGIN TRANSACTION')
+        
+        return sum(self.region_counts.values())
+    
+    def save_export_checkpoint(self, export_key, output_path, processed, f=None, done=False, compression=None):
+        """记录导出进度：已写出的行数及对应的文件位置，以及输出的压缩方式"""
+        if not self.job_id:
+            return
+        position = 0
+        if f is not None:
+            f.flush()
+            position = f.tell()
+        self.set_checkpoint(export_key, {'path': output_path, 'rows': processed, 'bytes': position, 'done': done,
+                                         'compression': compression})
+        self.conn.commit()
+        self.conn.execute('BEGIN TRANSACTION')
+    
+    def write_xlsx_streaming(self, output_path, table_name, columns, total_rows, sizer, progress_callback=None):
+        """以 openpyxl 只写模式导出Excel，逐行写出，不在内存中保留整个工作簿"""
+        from openpyxl import Workbook
+        
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet('Result')
+        worksheet.append(columns)
+        processed = 0
+        while processed < total_rows and self.is_processing:
+            self.cursor.execute(f"SELECT * FROM {table_name} LIMIT {sizer.batch_size} OFFSET {processed}")
+            rows = self.cursor.fetchall()
+            if not rows:
+                break
+            sizer.observe_rows(rows)
+            for row in rows:
+                worksheet.append(row)
+            processed += len(rows)
+            
+            if progress_callback:
+                progress_callback({
+                    'type': 'export',
+                    'processed': processed,
+                    'total': total_rows,
+                    'status': '导出中...'
+                })
+        workbook.save(output_path)
+        return processed
+    
+    def columnar_schema(self, table_name):
+        """按列的类型亲和性生成 Arrow 表结构；数值列中混有其他类型的值时该列按字符串导出"""
+        import pyarrow as pa
+        
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        columns = []
+        for col in self.cursor.fetchall():
+            declared = (col[2] or '').upper()
+            if 'INT' in declared:
+                columns.append((col[1], pa.int64(), 'integer'))
+            elif any(name in declared for name in ['REAL', 'FLOA', 'DOUB']):
+                columns.append((col[1], pa.float64(), 'real'))
+            else:
+                columns.append((col[1], pa.string(), None))
+        
+        numeric = [(name, storage) for name, _, storage in columns if storage]
+        mismatched = []
+        if numeric:
+            # 一次扫描统计各数值列中类型不符的值（如按覆盖配置强制为 INTEGER 的列中的文本）
+            checks = ', '.join(f"SUM(typeof({name}) NOT IN ('{storage}', 'null'))" for name, storage in numeric)
+            self.cursor.execute(f"SELECT {checks} FROM {table_name}")
+            counts = self.cursor.fetchone()
+            mismatched = [name for (name, _), count in zip(numeric, counts) if count]
+            if mismatched:
+                logger.info(f"列 {', '.join(mismatched)} 含非数值数据，按字符串导出")
+        return pa.schema([
+            (name, pa.string() if name in mismatched else arrow_type) for name, arrow_type, _ in columns
+        ])
+    
+    def write_columnar(self, output_path, export_format, table_name, sizer, compression, total_rows=0, progress_callback=None):
+        """以 Parquet / Arrow IPC 格式导出：游标逐批读取，每批写为一个行组（记录批）"""
+        writer = ColumnarWriter(output_path, export_format, self.columnar_schema(table_name), compression)
+        processed = 0
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {table_name}")
+            while self.is_processing:
+                rows = cursor.fetchmany(sizer.batch_size)
+                if not rows:
+                    break
+                sizer.observe_rows(rows)
+                writer.write(rows)
+                processed += len(rows)
+                
+                if progress_callback:
+                    progress_callback({
+                        'type': 'export',
+                        'processed': processed,
+                        'total': total_rows,
+                        'status': '导出中...'
+                    })
+        finally:
+            cursor.close()
+            writer.close()
+        return processed
+    
+    def rowid_ranges(self, table_name, rows_per_range):
+        """把表按 rowid 切成每段最多 rows_per_range 行的区间 (lo, hi]"""
+        self.cursor.execute(f"SELECT MIN(rowid), MAX(rowid), COUNT(*) FROM {table_name}")
+        lo, hi, count = self.cursor.fetchone()
+        if not count:
+            return []
+        if hi - lo + 1 == count:
+            # rowid 连续（CREATE TABLE AS 建立的结果表均如此），直接按算术切分
+            return [(start, min(start + rows_per_range, hi)) for start in range(lo - 1, hi, rows_per_range)]
+        bounds = [lo - 1]
+        cursor = self.conn.execute(f"SELECT rowid FROM {table_name} ORDER BY rowid")
+        for index, (rowid,) in enumerate(cursor, 1):
+            if index % rows_per_range == 0:
+                bounds.append(rowid)
+        if bounds[-1] != hi:
+            bounds.append(hi)
+        return list(zip(bounds, bounds[1:]))
+    
+    def shard_path(self, output_path, index):
+        base, ext = split_output_path(output_path)
+        return SHARD_NAME_FORMAT.format(base=base, index=index, ext=ext)
+    
+    def prepare_parallel_read(self):
+        """提交事务并释放排他锁，使其他进程可以只读打开工作库；内存数据库无法共享时返回False"""
+        if not self.temp_db or self.temp_db == ':memory:':
+            return False
+        self.conn.commit()
+        # 每条语句都读完结果，未执行完的语句会继续持有锁
+        wal = self.cursor.execute("PRAGMA journal_mode").fetchall()[0][0] == 'wal'
+        if wal:
+            # WAL 模式下无法直接退出排他锁模式，先临时切回回滚日志
+            self.cursor.execute("PRAGMA journal_mode = DELETE").fetchall()
+        self.cursor.execute("PRAGMA locking_mode = NORMAL").fetchall()
+        # 切换为 NORMAL 后需访问一次数据库才会释放已持有的锁
+        self.cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchall()
+        if wal:
+            self.cursor.execute("PRAGMA journal_mode = WAL").fetchall()
+        self.conn.commit()
+        self.conn.execute('BEGIN TRANSACTION')
+        return True
+    
+    def export_shards(self, output_path, export_format, table_name, sizer, compression=None,
+                      shard_rows=None, shard_bytes=None, parallel=False, progress_callback=None):
+        """分片导出，并在分片旁写出清单（各分片的文件名、行数、字节数和 SHA-256）
+        
+        按行数分片时每个分片对应一段 rowid 区间，parallel=True 时由多个进程并行写出；
+        按字节数分片（仅 CSV/TXT）时顺序写出，写满即换下一个文件。中断后整体重新导出。
+        """
+        manifest_path = split_output_path(output_path)[0] + MANIFEST_SUFFIX
+        export_key = f"export:{table_name}"
+        checkpoint = self.get_checkpoint(export_key)
+        if (checkpoint and checkpoint['done'] and checkpoint['path'] == manifest_path
+                and checkpoint.get('compression') == compression and os.path.exists(manifest_path)):
+            logger.info(f"分片结果已在上次运行中导出: {manifest_path}")
+            return checkpoint['rows']
+        
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        columns = [col[1] for col in self.cursor.fetchall()]
+        schema = self.columnar_schema(table_name) if export_format in COLUMNAR_FORMATS else None
+        
+        if shard_bytes:
+            shards = self.write_byte_shards(output_path, export_format, table_name, columns, sizer,
+                                            shard_bytes, progress_callback)
+        else:
+            ranges = self.rowid_ranges(table_name, shard_rows)
+            paths = [self.shard_path(output_path, index) for index in range(1, len(ranges) + 1)]
+            shards = []
+            if parallel and len(ranges) > 1 and self.prepare_parallel_read():
+                workers = min(len(ranges), os.cpu_count() or 1)
+                logger.info(f"使用 {workers} 个进程并行写出 {len(ranges)} 个分片")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                    futures = [
+                        pool.submit(write_shard_worker, self.temp_db, table_name, columns, rowid_range, path,
+                                    export_format, sizer.batch_size, compression, schema)
+                        for rowid_range, path in zip(ranges, paths)
+                    ]
+                    for future in futures:
+                        if not self.is_processing:
+                            for pending in futures:
+                                pending.cancel()
+                            break
+                        shards.append(future.result())
+                        self.report_shard_progress(shards, progress_callback)
+            else:
+                for rowid_range, path in zip(ranges, paths):
+                    if not self.is_processing:
+                        break
+                    shards.append(write_rowid_range(self.conn, table_name, columns, rowid_range, path,
+                                                    export_format, sizer.batch_size, compression, schema))
+                    self.report_shard_progress(shards, progress_callback)
+        
+        processed = sum(shard['rows'] for shard in shards)
+        if not self.is_processing:
+            logger.info(f"分片导出被停止，已写出 {len(shards)} 个分片")
+            return processed
+        
+        manifest = {
+            'table': table_name,
+            'format': export_format,
+            'total_rows': processed,
+            'shards': shards
+        }
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        self.run_report.setdefault('manifests', {})[table_name] = manifest_path
+        logger.info(f"分片导出完成: {len(shards)} 个分片，共 {processed} 行，清单 {manifest_path}")
+        self.save_export_checkpoint(export_key, manifest_path, processed, done=True, compression=compression)
+        return processed
+    
+    def write_byte_shards(self, output_path, export_format, table_name, columns, sizer, shard_bytes, progress_callback=None):
+        """按字节数顺序写出 CSV/TXT 分片，每个分片都带表头，单行超过上限时独占一个分片"""
+        header = text_header(columns, export_format).encode('utf-8')
+        shards = []
+        f = None
+        path = None
+        rows_in_shard = 0
+        
+        def finish_shard():
+            f.close()
+            shards.append({
+                'file': os.path.basename(path),
+                'rows': rows_in_shard,
+                'bytes': os.path.getsize(path),
+                'sha256': file_checksum(path)
+            })
+            self.report_shard_progress(shards, progress_callback)
+        
+        cursor = self.conn.execute(f"SELECT * FROM {table_name} ORDER BY rowid")
+        try:
+            while self.is_processing:
+                rows = cursor.fetchmany(sizer.batch_size)
+                if not rows:
+                    break
+                sizer.observe_rows(rows)
+                for row in rows:
+                    line = format_text_row(row, export_format).encode('utf-8')
+                    if f is not None and rows_in_shard and f.tell() + len(line) > shard_bytes:
+                        finish_shard()
+                        f = None
+                    if f is None:
+                        path = self.shard_path(output_path, len(shards) + 1)
+                        f = open(path, 'wb')
+                        f.write(header)
+                        rows_in_shard = 0
+                    f.write(line)
+                    rows_in_shard += 1
+            if f is not None:
+                finish_shard()
+        finally:
+            cursor.close()
+            if f is not None and not f.closed:
+                f.close()
+        return shards
+    
+    def export_parallel(self, output_path, export_format, table_name, columns, total_rows, sizer,
+                        compression=None, progress_callback=None):
+        """多进程并行导出单个 CSV/TXT 文件
+        
+        结果表按 rowid 切成若干区间，各进程以只读连接把区间写成分块文件（只有第一块带表头），
+        全部完成后按顺序拼接到输出文件。压缩导出时每块是独立的 gzip 成员 / zstd 帧，拼接后仍可直接解压。
+        只有一个CPU、结果太小或工作库无法共享时返回None，由调用方顺序导出。
+        """
+        workers = os.cpu_count() or 1
+        part_rows = max(PARALLEL_MIN_PART_ROWS, -(-total_rows // (workers * PARALLEL_PARTS_PER_WORKER)))
+        ranges = self.rowid_ranges(table_name, part_rows)
+        if workers < 2 or len(ranges) < 2 or not self.prepare_parallel_read():
+            return None
+        workers = min(workers, len(ranges))
+        parts = [PART_NAME_FORMAT.format(path=output_path, index=index) for index in range(1, len(ranges) + 1)]
+        logger.info(f"使用 {workers} 个进程并行导出 {len(ranges)} 个分块: {output_path}")
+        
+        processed = 0
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [
+                    pool.submit(write_shard_worker, self.temp_db, table_name, columns, rowid_range, part,
+                                export_format, sizer.batch_size, compression, None, index == 0, False)
+                    for index, (rowid_range, part) in enumerate(zip(ranges, parts))
+                ]
+                for future in futures:
+                    if not self.is_processing:
+                        for pending in futures:
+                            pending.cancel()
+                        logger.info(f"并行导出被停止，已写出 {processed} 行")
+                        return processed
+                    processed += future.result()['rows']
+                    if progress_callback:
+                        progress_callback({
+                            'type': 'export',
+                            'processed': processed,
+                            'total': total_rows,
+                            'status': '导出中...'
+                        })
+            
+            with open(output_path, 'wb') as out:
+                for part in parts:
+                    append_file(out, part)
+        finally:
+            for part in parts:
+                if os.path.exists(part):
+                    os.remove(part)
+        return processed
+    
+    def report_shard_progress(self, shards, progress_callback=None):
+        if progress_callback:
+            progress_callback({
+                'type': 'export',
+                'processed': sum(shard['rows'] for shard in shards),
+                'status': f"已写出 {len(shards)} 个分片"
+            })
+    
+    def export_result(self, output_path, export_format, progress_callback=None, table_name='result', compression=None,
+                      shard_rows=None, shard_bytes=None, parallel=False):
+        """导出结果
+        
+        Args:
+            compression: parquet/arrow 的压缩算法（见 COLUMNAR_COMPRESSIONS），默认 zstd；
+                csv/txt 可选 gzip 或 zstd，输出路径缺少对应后缀时自动追加
+            shard_rows: 每个分片的最大行数；与 shard_bytes 都不指定时导出为单个文件
+            shard_bytes: 每个分片的最大字节数（仅 CSV/TXT）
+            parallel: 是否由多个进程并行写出；按行数分片时并行写各分片，
+                不分片时 CSV/TXT 按 rowid 区间并行写出后拼接为单个文件
+        """
+        self.governor.begin_stage(f"导出 {table_name}")
         try:
             # 验证参数
             if not output_path or not isinstance(output_path, str):
@@ -688,10 +3301,38 @@ class DataProcessor:
                 raise ValueError("导出格式不能为空")
             
             # 验证导出格式
-            valid_formats = ['csv', 'xlsx', 'txt']
+            valid_formats = ['csv', 'xlsx', 'txt'] + COLUMNAR_FORMATS
             if export_format not in valid_formats:
                 raise ValueError(f"不支持的导出格式: {export_format}，支持的格式: {', '.join(valid_formats)}")
             
+            # 验证压缩算法
+            if export_format in COLUMNAR_FORMATS:
+                compression = compression or DEFAULT_COLUMNAR_COMPRESSION
+                if compression not in COLUMNAR_COMPRESSIONS[export_format]:
+                    raise ValueError(f"{export_format} 不支持的压缩算法: {compression}，"
+                                     f"支持的算法: {', '.join(COLUMNAR_COMPRESSIONS[export_format])}")
+            elif export_format in ['csv', 'txt'] and compression:
+                if compression not in TEXT_COMPRESSIONS:
+                    raise ValueError(f"{export_format} 不支持的压缩算法: {compression}，"
+                                     f"支持的算法: {', '.join(TEXT_COMPRESSIONS)}")
+                if not output_path.lower().endswith(TEXT_COMPRESSIONS[compression]):
+                    output_path += TEXT_COMPRESSIONS[compression]
+                    logger.info(f"压缩导出，输出文件: {output_path}")
+            elif compression:
+                raise ValueError(f"{export_format} 格式不支持压缩")
+            
+            # 验证分片参数
+            if shard_rows and shard_bytes:
+                raise ValueError("分片行数和分片字节数只能指定一个")
+            if shard_bytes and (export_format not in ['csv', 'txt'] or compression):
+                raise ValueError("按字节数分片仅支持未压缩的 csv/txt 格式")
+            if parallel and not shard_rows and export_format not in ['csv', 'txt']:
+                raise ValueError(f"{export_format} 格式并行导出需要指定分片行数")
+            if export_format == 'xlsx' and (shard_rows or 0) > XLSX_MAX_ROWS:
+                raise ValueError(f"Excel 分片行数不能超过 {XLSX_MAX_ROWS}")
+            if (shard_rows is not None and shard_rows <= 0) or (shard_bytes is not None and shard_bytes <= 0):
+                raise ValueError("分片大小必须为正数")
+            
             # 验证输出目录存在
             output_dir = os.path.dirname(output_path)
             if output_dir:
@@ -712,7 +3353,7 @@ class DataProcessor:
             
             # 验证结果表存在
             try:
-                self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='result'")
+                self.cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
                 if not self.cursor.fetchone():
                     raise ValueError("结果表不存在，请先执行运算")
             except Exception as e:
@@ -724,11 +3365,11 @@ class DataProcessor:
                     })
                 raise ValueError(error_msg)
             
-            batch_size = 50000  # 减少批量大小，降低内存使用
+            sizer = BatchSizer(self.governor, f"导出 {table_name}")
             
             # 获取表结构
             try:
-                self.cursor.execute("PRAGMA table_info(result)")
+                self.cursor.execute(f"PRAGMA table_info({table_name})")
                 columns = [col[1] for col in self.cursor.fetchall()]
                 
                 if not columns:
@@ -744,7 +3385,7 @@ class DataProcessor:
             
             # 获取总行数
             try:
-                self.cursor.execute("SELECT COUNT(*) FROM result")
+                self.cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
                 total_rows = self.cursor.fetchone()[0]
             except Exception as e:
                 error_msg = f"获取结果行数失败: {str(e)}"
@@ -755,18 +3396,21 @@ class DataProcessor:
                     })
                 raise ValueError(error_msg)
             
+            if shard_rows or shard_bytes:
+                return self.export_shards(output_path, export_format, table_name, sizer, compression,
+                                          shard_rows, shard_bytes, parallel, progress_callback)
+            
             if total_rows == 0:
                 # 结果为空，创建空文件
                 try:
-                    if export_format == 'csv':
-                        with open(output_path, 'w', encoding='utf-8', newline='') as f:
-                            f.write(','.join(columns) + '\n')
+                    if export_format in ['csv', 'txt']:
+                        with open_text_output(output_path, export_format, compression) as f:
+                            f.write(text_header(columns, export_format))
                     elif export_format == 'xlsx':
                         with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
                             pd.DataFrame(columns=columns).to_excel(writer, index=False, sheet_name='Result')
-                    elif export_format == 'txt':
-                        with open(output_path, 'w', encoding='utf-8') as f:
-                            f.write('\t'.join(columns) + '\n')
+                    elif export_format in COLUMNAR_FORMATS:
+                        self.write_columnar(output_path, export_format, table_name, sizer, compression)
                 except Exception as e:
                     error_msg = f"创建空文件失败: {str(e)}"
                     if progress_callback:
@@ -789,18 +3433,45 @@ class DataProcessor:
             # 分批导出
             processed = 0
             
-            if export_format == 'csv':
-                # CSV导出
+            # 检查点：CSV/TXT可在上次写入的位置续写，Excel需重新导出；
+            # 路径或压缩方式与上次不同时重新导出，避免把不同编码的内容续写进同一个文件
+            export_key = f"export:{table_name}"
+            checkpoint = self.get_checkpoint(export_key)
+            resume = None
+            if (checkpoint and checkpoint['path'] == output_path and checkpoint.get('compression') == compression
+                    and os.path.exists(output_path)):
+                if checkpoint['done']:
+                    logger.info(f"结果已在上次运行中导出: {output_path}")
+                    return checkpoint['rows']
+                if export_format in ['csv', 'txt'] and os.path.getsize(output_path) >= checkpoint['bytes']:
+                    resume = checkpoint
+                    logger.info(f"从第 {resume['rows']} 行恢复导出: {output_path}")
+            
+            parallel_rows = None
+            if parallel and export_format in ['csv', 'txt'] and not resume:
+                parallel_rows = self.export_parallel(output_path, export_format, table_name, columns, total_rows,
+                                                     sizer, compression, progress_callback)
+            
+            if parallel_rows is not None:
+                processed = parallel_rows
+            elif export_format in ['csv', 'txt']:
+                # CSV/TXT导出（可选 gzip/zstd 压缩）
                 try:
-                    with open(output_path, 'w', encoding='utf-8', newline='') as f:
-                        # 写入表头
-                        f.write(','.join(columns) + '\n')
+                    with open_text_output(output_path, export_format, compression, resume['bytes'] if resume else None) as f:
+                        if resume:
+                            # 已截掉检查点之后未确认的内容
+                            processed = resume['rows']
+                        else:
+                            # 写入表头
+                            f.write(text_header(columns, export_format))
                         
                         # 分批读取并写入
+                        unsaved = 0  # 上次检查点之后写出的字符数
                         while processed < total_rows and self.is_processing:
                             try:
-                                self.cursor.execute(f"SELECT * FROM result LIMIT {batch_size} OFFSET {processed}")
+                                self.cursor.execute(f"SELECT * FROM {table_name} LIMIT {sizer.batch_size} OFFSET {processed}")
                                 rows = self.cursor.fetchall()
+                                sizer.observe_rows(rows)
                             except Exception as e:
                                 error_msg = f"读取数据失败: {str(e)}"
                                 if progress_callback:
@@ -814,10 +3485,9 @@ class DataProcessor:
                                 break
                             
                             try:
-                                for row in rows:
-                                    # 处理行数据
-                                    row_str = ','.join(['"' + str(cell).replace('"', '""') + '"' if cell is not None else '' for cell in row])
-                                    f.write(row_str + '\n')
+                                lines = [format_text_row(row, export_format) for row in rows]
+                                f.writelines(lines)
+                                unsaved += sum(map(len, lines))
                             except Exception as e:
                                 error_msg = f"写入文件失败: {str(e)}"
                                 if progress_callback:
@@ -828,6 +3498,10 @@ class DataProcessor:
                                 raise ValueError(error_msg)
                             
                             processed += len(rows)
+                            # 检查点需要刷新输出（压缩输出会结束当前帧），按写出量间隔记录
+                            if unsaved >= EXPORT_CHECKPOINT_BYTES:
+                                self.save_export_checkpoint(export_key, output_path, processed, f, compression=compression)
+                                unsaved = 0
                             
                             if progress_callback:
                                 progress_callback({
@@ -837,7 +3511,7 @@ class DataProcessor:
                                     'status': '导出中...'
                                 })
                 except Exception as e:
-                    error_msg = f"CSV导出失败: {str(e)}"
+                    error_msg = f"{export_format.upper()}导出失败: {str(e)}"
                     if progress_callback:
                         progress_callback({
                             'type': 'error',
@@ -848,52 +3522,56 @@ class DataProcessor:
             elif export_format == 'xlsx':
                 # Excel导出
                 try:
-                    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                        # 分批读取并写入
-                        while processed < total_rows and self.is_processing:
-                            try:
-                                self.cursor.execute(f"SELECT * FROM result LIMIT {batch_size} OFFSET {processed}")
-                                rows = self.cursor.fetchall()
-                            except Exception as e:
-                                error_msg = f"读取数据失败: {str(e)}"
-                                if progress_callback:
-                                    progress_callback({
-                                        'type': 'error',
-                                        'error': error_msg
-                                    })
-                                raise ValueError(error_msg)
+                    if self.governor.use_streaming_xlsx(total_rows * len(columns)):
+                        processed = self.write_xlsx_streaming(output_path, table_name, columns, total_rows, sizer, progress_callback)
+                    else:
+                        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+                            # 分批读取并写入
+                            while processed < total_rows and self.is_processing:
+                                try:
+                                    self.cursor.execute(f"SELECT * FROM {table_name} LIMIT {sizer.batch_size} OFFSET {processed}")
+                                    rows = self.cursor.fetchall()
+                                    sizer.observe_rows(rows)
+                                except Exception as e:
+                                    error_msg = f"读取数据失败: {str(e)}"
+                                    if progress_callback:
+                                        progress_callback({
+                                            'type': 'error',
+                                            'error': error_msg
+                                        })
+                                    raise ValueError(error_msg)
                             
-                            if not rows:
-                                break
+                                if not rows:
+                                    break
+                            
+                                try:
+                                    df = pd.DataFrame(rows, columns=columns)
+                                    if processed == 0:
+                                        df.to_excel(writer, index=False, sheet_name='Result')
+                                    else:
+                                        # 追加数据
+                                        worksheet = writer.sheets['Result']
+                                        start_row = worksheet.max_row
+                                        for _, row in df.iterrows():
+                                            worksheet.append(row.tolist())
+                                except Exception as e:
+                                    error_msg = f"写入Excel失败: {str(e)}"
+                                    if progress_callback:
+                                        progress_callback({
+                                            'type': 'error',
+                                            'error': error_msg
+                                        })
+                                    raise ValueError(error_msg)
+                            
+                                processed += len(rows)
                             
-                            try:
-                                df = pd.DataFrame(rows, columns=columns)
-                                if processed == 0:
-                                    df.to_excel(writer, index=False, sheet_name='Result')
-                                else:
-                                    # 追加数据
-                                    worksheet = writer.sheets['Result']
-                                    start_row = worksheet.max_row
-                                    for _, row in df.iterrows():
-                                        worksheet.append(row.tolist())
-                            except Exception as e:
-                                error_msg = f"写入Excel失败: {str(e)}"
                                 if progress_callback:
                                     progress_callback({
-                                        'type': 'error',
-                                        'error': error_msg
+                                        'type': 'export',
+                                        'processed': processed,
+                                        'total': total_rows,
+                                        'status': '导出中...'
                                     })
-                                raise ValueError(error_msg)
-                            
-                            processed += len(rows)
-                            
-                            if progress_callback:
-                                progress_callback({
-                                    'type': 'export',
-                                    'processed': processed,
-                                    'total': total_rows,
-                                    'status': '导出中...'
-                                })
                 except Exception as e:
                     error_msg = f"Excel导出失败: {str(e)}"
                     if progress_callback:
@@ -902,56 +3580,13 @@ class DataProcessor:
                             'error': error_msg
                         })
                     raise ValueError(error_msg)
-            
-            elif export_format == 'txt':
-                # TXT导出
+            elif export_format in COLUMNAR_FORMATS:
+                # Parquet / Arrow IPC 导出，不支持断点续写，中断后重新导出
                 try:
-                    with open(output_path, 'w', encoding='utf-8') as f:
-                        # 写入表头
-                        f.write('\t'.join(columns) + '\n')
-                        
-                        # 分批读取并写入
-                        while processed < total_rows and self.is_processing:
-                            try:
-                                self.cursor.execute(f"SELECT * FROM result LIMIT {batch_size} OFFSET {processed}")
-                                rows = self.cursor.fetchall()
-                            except Exception as e:
-                                error_msg = f"读取数据失败: {str(e)}"
-                                if progress_callback:
-                                    progress_callback({
-                                        'type': 'error',
-                                        'error': error_msg
-                                    })
-                                raise ValueError(error_msg)
-                            
-                            if not rows:
-                                break
-                            
-                            try:
-                                for row in rows:
-                                    # 处理行数据
-                                    row_str = '\t'.join([str(cell) if cell is not None else '' for cell in row])
-                                    f.write(row_str + '\n')
-                            except Exception as e:
-                                error_msg = f"写入文件失败: {str(e)}"
-                                if progress_callback:
-                                    progress_callback({
-                                        'type': 'error',
-                                        'error': error_msg
-                                    })
-                                raise ValueError(error_msg)
-                            
-                            processed += len(rows)
-                            
-                            if progress_callback:
-                                progress_callback({
-                                    'type': 'export',
-                                    'processed': processed,
-                                    'total': total_rows,
-                                    'status': '导出中...'
-                                })
+                    processed = self.write_columnar(output_path, export_format, table_name, sizer, compression,
+                                                    total_rows, progress_callback)
                 except Exception as e:
-                    error_msg = f"TXT导出失败: {str(e)}"
+                    error_msg = f"{export_format} 导出失败: {str(e)}"
                     if progress_callback:
                         progress_callback({
                             'type': 'error',
@@ -961,6 +3596,9 @@ class DataProcessor:
             else:
                 raise ValueError(f"不支持的导出格式: {export_format}")
             
+            if processed >= total_rows:
+                self.save_export_checkpoint(export_key, output_path, processed, done=True, compression=compression)
+            
             return processed
         except Exception as e:
             error_msg = f"导出时出错: {str(e)}"
@@ -973,6 +3611,121 @@ class DataProcessor:
     
 
     
+    def preview_columns(self, table_name):
+        """校验结果表存在，返回其数据列"""
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        if not self.cursor.fetchone():
+            raise ValueError(f"表不存在: {table_name}")
+        return self.table_columns(table_name)
+    
+    def result_head(self, n=PREVIEW_ROWS, table_name='result'):
+        """结果表的前 n 行（按 rowid，即导出顺序）"""
+        columns_str = ','.join(self.preview_columns(table_name))
+        self.cursor.execute(f"SELECT {columns_str} FROM {table_name} ORDER BY rowid LIMIT ?", (n,))
+        return [list(row) for row in self.cursor.fetchall()]
+    
+    def result_tail(self, n=PREVIEW_ROWS, table_name='result'):
+        """结果表的后 n 行，按导出顺序排列"""
+        columns_str = ','.join(self.preview_columns(table_name))
+        self.cursor.execute(f"SELECT {columns_str} FROM {table_name} ORDER BY rowid DESC LIMIT ?", (n,))
+        return [list(row) for row in reversed(self.cursor.fetchall())]
+    
+    def result_sample(self, n=PREVIEW_SAMPLE_ROWS, table_name='result'):
+        """随机抽样约 n 行：在 rowid 范围内随机取点，每个点一次主键查找，不扫描全表
+        
+        rowid 不连续（如增量模式的结果表）时，空隙后的行被抽中的概率略高。
+        """
+        columns_str = ','.join(self.preview_columns(table_name))
+        self.cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table_name}")
+        lo, hi = self.cursor.fetchone()
+        if lo is None:
+            return []
+        if hi - lo < n:
+            return self.result_head(n, table_name)
+        
+        rows = {}
+        for point in random.sample(range(lo, hi + 1), n):
+            self.cursor.execute(
+                f"SELECT rowid, {columns_str} FROM {table_name} WHERE rowid >= ? ORDER BY rowid LIMIT 1", (point,)
+            )
+            row = self.cursor.fetchone()
+            rows[row[0]] = list(row[1:])
+        return [rows[rowid] for rowid in sorted(rows)]
+    
+    def result_stats(self, table_name='result', max_rows=PREVIEW_STATS_ROWS, total=None):
+        """各列的不同值数（不含空值）和空值数
+        
+        行数不超过 max_rows 时统计全表；否则从 rowid 范围内均匀分布的 PREVIEW_STATS_BLOCKS 个数据块中
+        取共 max_rows 行统计，结果中 exact 为 False，rows 为实际统计的行数。
+        """
+        columns = self.preview_columns(table_name)
+        if total is None:
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            total = self.cursor.fetchone()[0]
+        
+        source = table_name
+        exact = total <= max_rows
+        if not exact:
+            self.cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table_name}")
+            lo, hi = self.cursor.fetchone()
+            step = (hi - lo + 1) / PREVIEW_STATS_BLOCKS
+            block_rows = max_rows // PREVIEW_STATS_BLOCKS
+            source = 'temp.preview_sample'
+            self.cursor.execute(f"DROP TABLE IF EXISTS {source}")
+            self.cursor.execute(f"CREATE TEMP TABLE preview_sample AS SELECT {','.join(columns)} FROM {table_name} WHERE 0")
+            for i in range(PREVIEW_STATS_BLOCKS):
+                self.cursor.execute(
+                    f"INSERT INTO {source} SELECT {','.join(columns)} FROM {table_name} "
+                    f"WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+                    (lo - 1 + int(i * step), lo - 1 + int((i + 1) * step), block_rows)
+                )
+        
+        try:
+            aggregates = ', '.join(f"COUNT(DISTINCT {col}), SUM({col} IS NULL)" for col in columns)
+            self.cursor.execute(f"SELECT COUNT(*), {aggregates} FROM {source}")
+            row = self.cursor.fetchone()
+        finally:
+            if not exact:
+                self.cursor.execute(f"DROP TABLE {source}")
+        return {
+            'rows': row[0],
+            'exact': exact,
+            'columns': {
+                col: {'distinct': row[1 + 2 * i], 'nulls': row[2 + 2 * i] or 0}
+                for i, col in enumerate(columns)
+            }
+        }
+    
+    def preview_result(self, table_name='result', rows=PREVIEW_ROWS, sample_rows=PREVIEW_SAMPLE_ROWS):
+        """结果预览（F017）：总行数、首尾 rows 行、随机抽样 sample_rows 行和各列统计
+        
+        只执行有界的只读查询，须在 close_db 删除工作库之前调用。返回的值可直接序列化为JSON。
+        """
+        start_time = time.time()
+        columns = self.preview_columns(table_name)
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        total = self.cursor.fetchone()[0]
+        preview = {
+            'table': table_name,
+            'columns': columns,
+            'total': total,
+            'head': self.result_head(rows, table_name),
+            'tail': self.result_tail(rows, table_name),
+            'sample': self.result_sample(sample_rows, table_name),
+            'stats': self.result_stats(table_name, total=total)
+        }
+        logger.info(f"结果预览 {table_name}: {total} 行，统计 {preview['stats']['rows']} 行，"
+                    f"用时 {time.time() - start_time:.2f} 秒")
+        return preview
+    
     def stop_processing(self):
-        """停止处理"""
+        """停止处理：中断正在执行的SQL，后续语句由进度处理器拒绝执行"""
         self.is_processing = False
+        self.cancel_requested = True
+        if self.conn:
+            try:
+                # interrupt 可以从其他线程安全调用
+                self.conn.interrupt()
+                logger.info("已中断正在执行的SQL")
+            except Exception as e:
+                logger.warning(f"中断SQL失败: {e}")
@@ -0,0 +1,61 @@
+"""启动耗时测试：界面和后端模块的导入不得加载 pandas / numpy 等重量级依赖，且不超出启动预算
+
+每个测试在新的子进程中导入或启动，避免受本进程已加载模块的影响。
+"""
+import ast
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['pandas', 'numpy', 'psutil']
+
+
+def startup_budget():
+    """读取 SetOpsUI.STARTUP_BUDGET（按源码解析，不导入 PySide6）"""
+    with open(os.path.join(ROOT, 'SetOpsUI.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, 'id', None) == 'STARTUP_BUDGET' for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise AssertionError('SetOpsUI.py 中没有 STARTUP_BUDGET')
+
+
+def import_in_subprocess(module):
+    """在新的解释器中导入模块，返回导入耗时（秒）和已加载的重量级依赖"""
+    code = f"""
+import json, sys, time
+sys.path[:0] = [{ROOT!r}, {os.path.join(ROOT, 'backend')!r}]
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_data_processor_import_is_lazy():
+    result = import_in_subprocess('data_processor')
+    assert result['loaded'] == []
+    assert result['elapsed'] < startup_budget()
+
+
+def test_ui_import_within_budget():
+    pytest.importorskip('PySide6')
+    result = import_in_subprocess('SetOpsUI')
+    assert result['loaded'] == []
+    assert result['elapsed'] < startup_budget()
+
+
+def test_window_shown_within_budget(tmp_path):
+    """无显示环境下（offscreen）启动界面直到主窗口显示，耗时不得超出预算"""
+    pytest.importorskip('PySide6')
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', SETOPS_SCRATCH_DIR=str(tmp_path))
+    result = subprocess.run([sys.executable, 'SetOpsUI.py', '--benchmark-startup'], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr